@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the column-wise ApplyRow aggregators, against the row-by-row
+DataFrame.apply path they replace.
+
+Usage: python bench_symbol_aggs.py [rows] [feeds]
+"""
+import sys
+import timeit
+
+import pandas as pd
+
+from trump.extensions.symbol_aggs import FeedAggregator
+
+
+def make_fake_datatable(rows, feeds):
+    """ builds an aggregation-ready frame, with some holes in every column """
+    dr = pd.date_range(start='1990-01-01', periods=rows, freq='D')
+    cols = ['override_feed000']
+    cols += ["feed{0:03d}".format(i + 1) for i in range(feeds)]
+    cols += ['failsafe_feed999']
+
+    data = pd.np.random.rand(rows, len(cols))
+    data[pd.np.random.rand(rows, len(cols)) < 0.2] = pd.np.nan
+    data[:, 0][pd.np.random.rand(rows) < 0.95] = pd.np.nan
+    data[:, -1][pd.np.random.rand(rows) < 0.95] = pd.np.nan
+    return pd.DataFrame(data, index=dr, columns=cols)
+
+
+def bench(rows=10000, feeds=3, repeat=3):
+    df = make_fake_datatable(rows, feeds)
+
+    print "{} rows, {} feeds, best of {}".format(rows, feeds, repeat)
+    print "{:<15}{:>12}{:>12}{:>10}".format('method', 'apply (s)',
+                                             'numpy (s)', 'speedup')
+
+    for meth in ['priority_fill', 'mean_fill', 'median_fill']:
+        slow = FeedAggregator(meth, vectorized=False)
+        fast = FeedAggregator(meth)
+
+        pd.util.testing.assert_series_equal(slow.aggregate(df),
+                                            fast.aggregate(df))
+
+        tslow = min(timeit.repeat(lambda: slow.aggregate(df),
+                                  number=1, repeat=repeat))
+        tfast = min(timeit.repeat(lambda: fast.aggregate(df),
+                                  number=1, repeat=repeat))
+
+        print "{:<15}{:>12.4f}{:>12.4f}{:>9.0f}x".format(meth, tslow, tfast,
+                                                        tslow / tfast)
+
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    bench(*args)
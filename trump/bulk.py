@@ -0,0 +1,248 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+#
+# Using the global statement, ignored, it's how pool workers keep their
+#                                      fetchcache between tasks.
+# pylint: disable-msg=W0603
+
+"""
+The bulk caching engine caches many Symbols at once, through a pool of
+threads, each using its own database session, or of processes, which run
+each Symbol's plan without a session.  Concurrent
+fetches can be limited per source type, so one slow vendor can't tie up
+every worker.  DBAPI KEYCOL Feeds sharing a table are fetched up front,
+with one query per table, and PyDataCSV Feeds sharing a file with one
+parse per file, instead of one per Feed.
+"""
+
+import multiprocessing
+import threading
+from multiprocessing.pool import ThreadPool
+
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm.session import object_session
+
+from trump.options import read_config
+from trump.sourcing import set_source_limits, FetchCache
+from trump.plans import load_plans
+
+
+def _config_source_limits():
+    limits = read_config(sect='source_limits', default={})
+    return {stype: int(lim) for stype, lim in limits.iteritems()}
+
+
+class BulkCacher(object):
+
+    """
+    Caches a list of Symbols, serially in the calling session, or
+    concurrently via a thread or process pool.
+    """
+
+    def __init__(self, engine, workers=None, mode=None, source_limits=None):
+        """
+        Parameters
+        ----------
+        engine : sqlalchemy.engine.Engine
+            The engine of the SymbolManager doing the bulk cache.
+        workers : int, optional
+            The size of the pool.  Defaults to the [bulk] workers setting
+            in trump.cfg, or 1, which caches serially.
+        mode : str, optional
+            'thread' or 'process'.  Defaults to the [bulk] mode setting
+            in trump.cfg, or 'thread'.
+        source_limits : dict, optional
+            Maximum concurrent fetches, keyed by source type, eg.
+            {'Quandl' : 2}.  Defaults to the [source_limits] section
+            of trump.cfg.
+        """
+        if workers is None:
+            workers = read_config(sect='bulk', sett='workers', default='1')
+        if mode is None:
+            mode = read_config(sect='bulk', sett='mode', default='thread')
+        if source_limits is None:
+            source_limits = _config_source_limits()
+
+        if mode not in ('thread', 'process'):
+            raise Exception("Unknown bulk caching mode {}".format(mode))
+
+        self.engine = engine
+        self.workers = int(workers)
+        self.mode = mode
+        self.source_limits = source_limits
+
+    @property
+    def concurrent(self):
+        """
+        In-memory SQLite databases are private to a connection, so they
+        can't be shared by workers, and get cached serially.
+        """
+        url = self.engine.url
+        in_memory = url.drivername.startswith('sqlite') and \
+                    url.database in (None, '', ':memory:')
+        return self.workers > 1 and not in_memory
+
+    def cache(self, symbols, **kwargs):
+        """
+        Caches each Symbol.
+
+        Parameters
+        ----------
+        symbols : list of Symbol
+            Symbols from the calling session.  Any pending changes
+            must be committed, before caching concurrently.
+        kwargs
+            Passed on to Symbol.cache(), other than force_refresh, which
+            is passed on to prefetch().
+
+        Returns
+        -------
+        list of SymbolReport, in the same order as symbols.
+        """
+        names = [sym.name for sym in symbols]
+
+        # every Symbol's configuration, in a fixed number of queries.
+        plans = {}
+        if symbols:
+            plans = load_plans(object_session(symbols[0]), names)
+
+        fetchcache = kwargs.pop('fetchcache', None)
+        force_refresh = kwargs.pop('force_refresh', False)
+        if fetchcache is None:
+            fetchcache = self.prefetch(plans.values(), force_refresh,
+                                       kwargs.get('incremental', False))
+
+        if not self.concurrent:
+            return [sym.cache(fetchcache=fetchcache, plan=plans[sym.name],
+                              **kwargs)
+                    for sym in symbols]
+
+        if self.mode == 'thread':
+            kwargs['fetchcache'] = fetchcache
+            reports = self._cache_threaded(names, kwargs, plans)
+        else:
+            reports = self._cache_processes(symbols, kwargs, plans,
+                                            fetchcache)
+
+        # have the calling session's Symbols rebuild their datatables
+        for sym in symbols:
+            sym._init_datatable()
+
+        return reports
+
+    def prefetch(self, plans, force_refresh=False, incremental=False):
+        """
+        Fetches the data of the Symbols' DBAPI KEYCOL Feeds, grouped into
+        one query per connection and table, and of PyDataCSV Feeds
+        sharing a file, with one parse per file.  If that fails, the
+        Feeds are left to fetch their own data, and their handles apply.
+        The FetchCache is also shared by every Symbol in the run, so
+        Feeds sharing a payload, eg. a Quandl dataset, fetch it once.
+
+        Parameters
+        ----------
+        plans : list of SymbolPlan
+        force_refresh : bool, default False
+            Ignore snapshots of the Feeds' raw data, see SnapshotStore.
+        incremental : bool, default False
+            The Symbols will be cached incrementally.  Each one's start
+            isn't known yet, so KEYCOL Feeds are left to fetch just
+            their own recent data, rather than prefetching every history.
+
+        Returns
+        -------
+        FetchCache
+        """
+        requests = []
+        for plan in plans:
+            requests += plan.source_requests()
+        if incremental:
+            requests = [(stype, kwargs) for stype, kwargs in requests
+                        if kwargs.get('dbinstype') != 'KEYCOL']
+
+        fetchcache = FetchCache(force_refresh=force_refresh)
+        fetchcache.prefetch(requests, self.engine.driver)
+        return fetchcache
+
+    def _cache_threaded(self, names, kwargs, plans):
+        sems = {stype: threading.BoundedSemaphore(lim)
+                for stype, lim in self.source_limits.iteritems()}
+        set_source_limits(sems)
+
+        Session = sessionmaker(bind=self.engine)
+
+        def cache_one(name):
+            ses = Session()
+            try:
+                return _cache_in_session(ses, name,
+                                         dict(kwargs, plan=plans[name]))
+            finally:
+                ses.close()
+
+        pool = ThreadPool(self.workers)
+        try:
+            return pool.map(cache_one, names, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+            set_source_limits({})
+
+    def _cache_processes(self, symbols, kwargs, plans, fetchcache):
+        """
+        Runs each Symbol's plan in a worker process, which needs no
+        database session, and sends back only the final DataFrame and
+        the SymbolReport.  Datatables are written by the calling session.
+        """
+        sems = {stype: multiprocessing.BoundedSemaphore(lim)
+                for stype, lim in self.source_limits.iteritems()}
+
+        incremental = kwargs.get('incremental', False)
+        overlap = kwargs.get('overlap', 5)
+        checkvalidity = kwargs.get('checkvalidity', True)
+
+        tasks = []
+        for sym in symbols:
+            since, existing, smrp = sym._cache_start(incremental, overlap)
+            tasks.append((plans[sym.name], since, existing, smrp))
+
+        # pooled connections must not be shared with forked workers.
+        self.engine.dispose()
+
+        # the fetchcache is sent once per process, rather than per task.
+        pool = multiprocessing.Pool(self.workers, _init_process,
+                                    (sems, fetchcache, self.engine.driver))
+        try:
+            results = pool.map(_run_in_process, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        return [sym._write_cache(data, smrp, plan, since, existing,
+                                 checkvalidity)
+                for sym, (plan, since, existing, _), (data, smrp)
+                in zip(symbols, tasks, results)]
+
+
+def _cache_in_session(ses, name, kwargs):
+    from trump.orm import Symbol
+    sym = ses.query(Symbol).filter(Symbol.name == name).one()
+    return sym.cache(**kwargs)
+
+_process_fetchcache = None
+_process_driver = None
+
+def _init_process(sems, fetchcache, driver):
+    """ gives each pool process the run's fetchcache and source limits """
+    global _process_fetchcache, _process_driver
+    _process_fetchcache = fetchcache
+    _process_driver = driver
+    set_source_limits(sems)
+
+def _run_in_process(task):
+    plan, since, existing, smrp = task
+    return plan.run(since, existing, _process_fetchcache, None,
+                    _process_driver, smrp)
@@ -68,6 +68,8 @@ class DateTimeDataDef(ConvertedDataDef):
        
     @property
     def converted(self):
+        if isinstance(self.data, pd.DataFrame):
+            return self.data.apply(pd.to_datetime)
         return pd.to_datetime(self.data)
         
 def _pred(aclass):
@@ -21,10 +21,18 @@ This module creates the functions that get used in symbol aggregation
 
 There are row-based, and column-based, function builders, just to stay
 organized.
+
+Aggregators are looked up by name in a registry, and declare what kind
+they are: 'row', run on each row with DataFrame.apply; 'block', run once
+on the 2-D NumPy array of the whole frame; or 'column', run once on the
+DataFrame.  More can be added with register_aggregator().
 """
+import warnings
+
 import pandas as pd
 
-nan = pd.np.nan
+np = pd.np
+nan = np.nan
 
 def sorted_feed_cols(df):
     """
@@ -47,6 +55,129 @@ def _row_wise_priority(adf):
     else:
         return nan
 
+def _first_valid(values):
+    """
+    Picks the first non-null value of each row of a 2-D array, using
+    masks over the whole block, rather than looking at one row at a time.
+    """
+    valid = ~pd.isnull(values)
+    res = values[np.arange(len(values)), valid.argmax(axis=1)]
+    empty = ~valid.any(axis=1)
+    if empty.any():
+        if res.dtype.kind == 'M':
+            res[empty] = np.datetime64('NaT')
+        else:
+            if res.dtype.kind in 'iub':
+                res = res.astype(float)
+            res[empty] = nan
+    return res
+
+def _fill_with(reducer):
+    """
+    Builds a block version of an ApplyRow filler, which honours the
+    Trump override/failsafe logic, and reduces the feeds with a nan-aware
+    NumPy function, in one call over the whole block.
+    """
+    def filler(values):
+        ordpt = values[:, 0].astype(float)
+        flspt = values[:, -1].astype(float)
+        feeds = values[:, 1:-1].astype(float)
+
+        # all-NaN rows are expected, and fall through to the failsafe.
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            fdred = reducer(feeds, axis=1)
+
+        res = np.where(np.isnan(fdred), flspt, fdred)
+        return np.where(np.isnan(ordpt), res, ordpt)
+    return filler
+
+def _priority_fill_block(adf):
+    return pd.Series(_first_valid(adf.values), index=adf.index)
+
+def _choose_with(chooser):
+    """
+    Builds a masked version of a ChooseCol method.  The chooser picks a
+    feed column from a boolean array of which feed values are valid, and
+    the override, chosen feed and failsafe are then coalesced in one pass.
+    """
+    def choose(adf):
+        feeds_only = adf[adf.columns[1:-1]]
+
+        pick = None
+        if len(feeds_only.columns) > 0:
+            pick = chooser(~pd.isnull(feeds_only.values))
+
+        # if no feed gets picked, the first feed will work...
+        if pick is None:
+            pre_final = 'feed001'
+        else:
+            pre_final = feeds_only.columns[pick]
+
+        cols = ['override_feed000', pre_final, 'failsafe_feed999']
+        return _priority_fill_block(adf[cols])
+    return choose
+
+def _most_populated_col(valid):
+    # argmax picks the first, so highest priority, of any tied feeds.
+    return valid.sum(axis=0).argmax()
+
+def _most_recent_col(valid):
+    # the first feed with a value on every row any feed has a value for.
+    rows = valid.any(axis=1)
+    complete = valid[rows].all(axis=0)
+    if complete.any():
+        return complete.argmax()
+
+AGGREGATOR_KINDS = ('row', 'block', 'column')
+
+_aggregators = {}
+
+def register_aggregator(name, func, kind):
+    """
+    Adds an aggregation method, which Symbols can then use by name, as
+    their agg_method.  Registering an existing name replaces it.
+
+    Parameters
+    ----------
+    name : str
+    func : callable
+        Depending on kind, it takes:
+
+        - 'row', a Series of one row's values, returning a scalar.
+        - 'block', a 2-D NumPy array of every row's values, returning a
+          1-D array with one value per row.
+        - 'column', the DataFrame, returning a Series.
+
+        The columns are always in priority order, the override, then the
+        feeds, then the failsafe.
+    kind : str
+        'row', 'block' or 'column'.  Row aggregators are run one row at
+        a time, in Python, so a reduction is best written for a block.
+    """
+    if kind not in AGGREGATOR_KINDS:
+        raise ValueError("Aggregator kind must be one of {}, not {}"
+                         .format(AGGREGATOR_KINDS, kind))
+    _aggregators[name] = (func, kind)
+
+def get_aggregator(name):
+    """
+    Returns
+    -------
+    tuple of the registered function and its kind, see
+    register_aggregator(), or None if the name isn't registered.
+    """
+    return _aggregators.get(name)
+
+# Block and column-wise equivalents of the ApplyRow and ChooseCol methods,
+# which give the same result as the methods using DataFrame.apply(axis=1).
+register_aggregator('priority_fill', _first_valid, 'block')
+register_aggregator('mean_fill', _fill_with(np.nanmean), 'block')
+register_aggregator('median_fill', _fill_with(np.nanmedian), 'block')
+register_aggregator('most_populated', _choose_with(_most_populated_col),
+                    'column')
+register_aggregator('most_recent', _choose_with(_most_recent_col), 'column')
+
 class ApplyRow(object):
     """
     Mixer used to identify row-based logic methods for
@@ -198,14 +329,47 @@ class ChooseCol(object):
         return [0] * len(adf)
 
 class FeedAggregator(ApplyRow, ChooseCol):
-    def __init__(self,method):
-        try:
-            self.meth = getattr(self, method)
-        except:
-            raise "{} is not an arggregator method".format(method)
+    def __init__(self, method, vectorized=True):
+        """
+        Parameters
+        ----------
+        method : str
+            The name of a registered aggregator, see
+            register_aggregator(), or an ApplyRow or ChooseCol method.
+        vectorized : bool, optional
+            Use the registered aggregator, which for the built in
+            methods is a block or column-wise NumPy implementation.
+            Set to False, to force the ApplyRow or ChooseCol method,
+            where one exists, eg. the row-by-row DataFrame.apply path.
+        """
+        self.meth = getattr(self, method, None)
+        self.registered = get_aggregator(method)
+        if self.registered is None and self.meth is None:
+            raise Exception("{} is not an aggregator method".format(method))
         self.methname = method
+        self.vectorized = vectorized
+
+    @property
+    def rowwise(self):
+        """
+        True if each row's result depends only on that row, so a subset
+        of the rows can be aggregated on its own.  ChooseCol, or column
+        kind, aggregators pick a feed looking at every row, so they need
+        the whole frame.
+        """
+        if self.registered and (self.vectorized or self.meth is None):
+            return self.registered[1] in ('row', 'block')
+        return self.methname in ApplyRow.__dict__
+
     def aggregate(self,df):
-        if self.methname in ApplyRow.__dict__:
+        if self.registered and (self.vectorized or self.meth is None):
+            func, kind = self.registered
+            if kind == 'block':
+                return pd.Series(func(df.values), index=df.index)
+            elif kind == 'column':
+                return func(df)
+            return df.apply(func, axis=1)
+        elif self.methname in ApplyRow.__dict__:
             return df.apply(self.meth, axis=1)
         elif self.methname in ChooseCol.__dict__:
             return self.meth(df)
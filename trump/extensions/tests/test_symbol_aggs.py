@@ -1,6 +1,14 @@
-from ...extensions.symbol_aggs import FeedAggregator
+from ...extensions.symbol_aggs import FeedAggregator, register_aggregator, \
+    get_aggregator
+
+import os
 
 import pandas as pd
+from pandas.util.testing import assert_series_equal
+import pytest
+
+testdata = os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                        '..', '..', 'tests', 'testdata')
 
 def make_fake_feed_data(l=10):
     dr = pd.date_range(start='2015-01-10', periods=l, freq='D')
@@ -102,3 +110,84 @@ class TestSymbolAggregation(object):
         assert df['final'].iloc[-4] == df['feed003'].iloc[-4]
         assert df['final'].iloc[-2] == df['failsafe_feed999'].iloc[-2]
         assert pd.isnull(df['final'].iloc[-1])
+
+    def test_vectorized_matches_apply(self):
+
+        df = pd.concat([self.df] * 20)
+        df = df.reset_index(drop=True)
+        df.iloc[::7, 1:-1] = pd.np.nan
+        df.iloc[::11, -1] = pd.np.nan
+
+        for meth in ['priority_fill', 'mean_fill', 'median_fill']:
+            fast = FeedAggregator(meth).aggregate(df)
+            slow = FeedAggregator(meth, vectorized=False).aggregate(df)
+            assert_series_equal(fast, slow)
+
+    @pytest.mark.parametrize('fname', ['fxdata.csv', 'fxdata3.csv',
+                                       'testdailydata.csv'])
+    def test_vectorized_choosecol_matches_apply(self, fname):
+
+        data = pd.read_csv(os.path.join(testdata, fname), index_col=0)
+
+        # three feeds, repeating columns of files with fewer.
+        cols = list(data.columns) * 3
+        feeds = pd.concat([data[col] for col in cols[:3]], axis=1)
+
+        for gaps in range(4):
+            df = feeds.copy()
+            df.columns = ["feed{0:03d}".format(i + 1) for i in range(3)]
+            if gaps > 0:
+                df.iloc[::gaps + 1, 0] = pd.np.nan
+                df.iloc[-gaps:, 1] = pd.np.nan
+                df.iloc[:gaps * 3, 2] = pd.np.nan
+            if gaps > 2:
+                df.iloc[::5] = pd.np.nan
+
+            df.insert(0, 'override_feed000', pd.np.nan)
+            df['failsafe_feed999'] = pd.np.nan
+            df.iloc[1::6, 0] = -1.0
+            df.iloc[::4, -1] = -2.0
+
+            for meth in ['most_populated', 'most_recent']:
+                fast = FeedAggregator(meth).aggregate(df)
+                slow = FeedAggregator(meth, vectorized=False).aggregate(df)
+                assert_series_equal(fast, slow)
+
+    def test_vectorized_choosecol_empty_feeds(self):
+
+        df = self.df
+        df[df.columns[1:-1]] = pd.np.nan
+
+        for meth in ['most_populated', 'most_recent']:
+            fast = FeedAggregator(meth).aggregate(df)
+            slow = FeedAggregator(meth, vectorized=False).aggregate(df)
+            assert_series_equal(fast, slow)
+
+    def test_register_aggregator(self):
+
+        df = self.df
+
+        def feed_max(values):
+            return pd.np.nanmax(values[:, 1:-1], axis=1)
+        register_aggregator('feed_max', feed_max, 'block')
+        register_aggregator('feed_max_row',
+                            lambda row: row.iloc[1:-1].max(), 'row')
+        register_aggregator('feed_max_col',
+                            lambda adf: adf[adf.columns[1:-1]].max(axis=1),
+                            'column')
+
+        block = FeedAggregator('feed_max').aggregate(df)
+        row = FeedAggregator('feed_max_row').aggregate(df)
+        col = FeedAggregator('feed_max_col').aggregate(df)
+
+        assert_series_equal(block, row)
+        assert_series_equal(block, col)
+        assert block.iloc[0] == df.iloc[0, 1:-1].max()
+
+        assert get_aggregator('feed_max') == (feed_max, 'block')
+
+        with pytest.raises(ValueError):
+            register_aggregator('feed_max', feed_max, 'cell')
+
+        with pytest.raises(Exception):
+            FeedAggregator('not_registered')
@@ -0,0 +1,62 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+
+"""
+A MungingPipeline is a Feed's munging, compiled once into a list of
+callables, with each step's function looked up and kwargs decoded ahead
+of time, so applying it to a Feed's data costs no queries or reflection.
+Pipelines pickle as their steps, and are compiled again when unpickled.
+"""
+
+from operator import methodcaller
+
+import pandas as pd
+
+from trump.templating import pab, pnab
+
+
+def _nonattribute_step(func, kwargs):
+    return lambda data: func(data, **kwargs)
+
+
+class MungingPipeline(object):
+
+    """
+    The ordered munging steps of a Feed, as callables taking and returning
+    the Feed's data.
+    """
+
+    def __init__(self, steps):
+        """
+        Parameters
+        ----------
+        steps : list of (mtype, method, kwargs) tuples
+            In the order they're applied.  Steps of an unknown mtype are
+            skipped.
+        """
+        self.spec = tuple(steps)
+        self.steps = []
+        for mtype, method, kwargs in steps:
+            if mtype == pab:
+                # eg. data.pct_change(**kwargs)
+                self.steps.append(methodcaller(method, **kwargs))
+            elif mtype == pnab:
+                # eg. pandas.rolling_mean(data, **kwargs)
+                func = getattr(pd, method)
+                self.steps.append(_nonattribute_step(func, kwargs))
+
+    def __reduce__(self):
+        # the compiled steps hold lambdas, which can't be pickled.
+        return (MungingPipeline, (self.spec,))
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __call__(self, data):
+        for step in self.steps:
+            data = step(data)
+        return data
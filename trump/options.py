@@ -11,6 +11,7 @@
 """
 Parses config files at runtime, but still enables importing of this module
 """
+import copy
 import os
 import ConfigParser
 import warnings
@@ -24,54 +25,83 @@ def get_from_nested(keys, adict):
     else:
         return adict
 
+def _parse_options(config_dir):
+    """
+    Parses every .cfg and .cfg_sample file in a directory, with .cfg files
+    taking precedence over samples of the same name.
+
+    Returns
+    -------
+    tuple of the parsed dict, keyed by file, section then setting, and
+    a list of the sample files used.
+    """
+    config_files = [(f[:-4], f)
+                    for f in os.listdir(config_dir) if f[-4:] == ".cfg"]
+    sample_files = [(f[:-11], f)
+                    for f in os.listdir(config_dir) if f[-11:] == ".cfg_sample"]
+
+    cfg_files = dict(sample_files)
+    for fn, f in config_files:
+        cfg_files[fn] = f
+
+    sample_files_exposed = []
+
+    confg = {}
+
+    for src, fil in cfg_files.iteritems():
+        confg[src] = {}
+        cfpr = ConfigParser.ConfigParser()
+        cfpr.read(os.path.join(config_dir, fil))
+        for sec in cfpr.sections():
+            confg[src][sec] = dict(cfpr.items(sec))
+
+        if ".cfg_sample" in fil:
+            sample_files_exposed.append(fil)
+
+    return confg, sample_files_exposed
+
+def _options_stamp(config_dir):
+    """ the name and modification time of each file in the directory """
+    stamp = []
+    for f in sorted(os.listdir(config_dir)):
+        if f[-4:] == ".cfg" or f[-11:] == ".cfg_sample":
+            stamp.append((f, os.path.getmtime(os.path.join(config_dir, f))))
+    return tuple(stamp)
+
 def _read_options(paths,fname_def=None):
-    """Builds a configuration reader function"""
+    """Builds a configuration reader function
+
+    The files are only parsed again when one of them is added, removed or
+    modified, or the reader's reload() is called.
+    """
+    cur_dir = os.path.dirname(os.path.realpath(__file__))
+    config_dir = os.path.join(cur_dir, *paths)
+
+    memo = {'stamp' : None, 'confg' : None}
+
+    def load(force=False):
+        """ re-parses the files, if needed, and warns about samples """
+        stamp = _options_stamp(config_dir)
+        if force or stamp != memo['stamp']:
+            confg, sample_files_exposed = _parse_options(config_dir)
+
+            if len(sample_files_exposed) > 0:
+                msg = ", ".join(sample_files_exposed)
+                body = "{} sample configuration files have been exposed. " \
+                      "Rename *.cfg_sample to *.cfg, and populate the " \
+                      "correct settings in the config and settings " \
+                      "directories to avoid this warning."
+                msg = body.format(msg)
+                warnings.warn(msg)
+
+            memo['stamp'] = stamp
+            memo['confg'] = confg
+        return memo['confg']
+
     def reader_func(fname=fname_def, sect=None, sett=None, default=None):
         """Reads the configuration for trump"""
 
-        cur_dir = os.path.dirname(os.path.realpath(__file__))
-        config_dir = os.path.join(cur_dir, *paths)
-
-        config_files = [(f[:-4], f)
-                        for f in os.listdir(config_dir) if f[-4:] == ".cfg"]
-        sample_files = [(f[:-11], f)
-                        for f in os.listdir(config_dir) if f[-11:] == ".cfg_sample"]
-
-        if fname:
-            config_files = [f for f in config_files if f[0] == fname]
-            sample_files = [f for f in sample_files if f[0] == fname]
-
-
-        config_files = dict(config_files)
-        sample_files = dict(sample_files)
-
-        cfg_files = sample_files
-        for fn, f in config_files.iteritems():
-            cfg_files[fn] = f
-
-        sample_files_exposed = []
-
-        confg = {}
-
-        for src, fil in cfg_files.iteritems():
-            confg[src] = {}
-            cfpr = ConfigParser.ConfigParser()
-            cfpr.read(os.path.join(config_dir, fil))
-            for sec in cfpr.sections():
-                confg[src][sec] = dict(cfpr.items(sec))
-
-            if ".cfg_sample" in fil:
-                sample_files_exposed.append(fil)
-
-
-        if len(sample_files_exposed) > 0:
-            msg = ", ".join(sample_files_exposed)
-            body = "{} sample configuration files have been exposed. " \
-                  "Rename *.cfg_sample to *.cfg, and populate the " \
-                  "correct settings in the config and settings " \
-                  "directories to avoid this warning."
-            msg = body.format(msg)
-            warnings.warn(msg)
+        confg = load()
 
         keys = []
 
@@ -82,18 +112,26 @@ def _read_options(paths,fname_def=None):
                 if sett:
                     keys.append(sett)
         try:
-            return get_from_nested(keys, confg)
+            # copied, so callers can't modify the memoized settings.
+            return copy.deepcopy(get_from_nested(keys, confg))
         except KeyError:
             if default is not None:
                 return default
             else:
                 raise
 
+    reader_func.reload = lambda: load(force=True)
+
     return reader_func
 
 read_config = _read_options(["config"], 'trump')
 read_settings = _read_options(["templating", "settings"])
 
+def reload_options():
+    """ Re-parses all the config and settings files, even if unmodified """
+    read_config.reload()
+    read_settings.reload()
+
 if __name__ == '__main__':
     config = read_config()
     print config
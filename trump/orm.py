@@ -42,12 +42,14 @@ import datetime as dt
 
 import pandas as pd
 from sqlalchemy import event, Table, Column, ForeignKey, ForeignKeyConstraint,\
-    String, Integer, Float, Boolean, DateTime, MetaData, func
+    String, Integer, Float, Boolean, DateTime, MetaData, func, inspect
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship, aliased, backref
+from sqlalchemy.orm import sessionmaker, relationship, aliased, backref, \
+    joinedload
 from sqlalchemy.orm.session import object_session
-from sqlalchemy.exc import ProgrammingError, NoSuchTableError
-from sqlalchemy.sql import and_, or_
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.sql import and_, or_, bindparam, select, literal, \
+    union_all, table, column
 from sqlalchemy import create_engine
 
 from indexing import indexingtypes
@@ -56,15 +58,19 @@ from datadef import datadefs
 
 from trump.tools import ReprMixin, ProxyDict, isinstanceofany, \
     BitFlag, BitFlagType, ReprObjType, DuckTypeMixin
-
+from trump.tools.reprobj import migrate_reprobj_columns, encode
+
+from trump.templating import bFeed
+from trump.options import read_config
+from trump.sourcing import FetchCache
+from trump.bulk import BulkCacher
+from trump.writing import writer_for
+from trump.munging import MungingPipeline
+from trump.plans import load_plan, apply_orfs
 from trump.extensions.symbol_aggs import FeedAggregator, sorted_feed_cols
-from trump.templating import bFeed, pab, pnab
-from trump.options import read_config, read_settings
 from trump.converting import FXConverter
 
-from handling import Handler
-
-from reporting.objects import TrumpReport, FeedReport, SymbolReport, \
+from reporting.objects import TrumpReport, SymbolReport, \
     ReportPoint
 
 BitFlag.associate_with(BitFlagType)
@@ -91,6 +97,88 @@ Base = declarative_base()
 ADO = "all, delete-orphan"
 CC = {'onupdate': "CASCADE", 'ondelete': "CASCADE"}
 
+def _has_window_functions(dialect):
+    """ SQLite only supports window functions from version 3.25 """
+    if dialect.name == 'sqlite':
+        return dialect.dbapi.sqlite_version_info >= (3, 25)
+    return dialect.name in ('postgresql', 'oracle', 'mssql')
+
+# Compiled Feed munging, keyed by database, symbol name and feed number.
+# An entry is only used while its steps match the Feed's current munging.
+_munging_pipelines = {}
+
+def munging_pipeline(ses, feedkey, steps):
+    """
+    Gets a Feed's MungingPipeline from the cache, or compiles it, if the
+    Feed's munging has changed since it was cached, in this process or
+    any other.
+
+    Parameters
+    ----------
+    ses : Session
+    feedkey : tuple
+        The Feed's symbol name and feed number.
+    steps : list
+        The Feed's current munging steps, see MungingPipeline.
+    """
+    key = (str(ses.bind.url),) + tuple(feedkey)
+    pipeline = _munging_pipelines.get(key)
+    if pipeline is None or pipeline.spec != tuple(steps):
+        pipeline = MungingPipeline(steps)
+        _munging_pipelines[key] = pipeline
+    return pipeline
+
+def latest_orfs(ses, which, names):
+    """
+    Selects the most recently logged Override or FailSafe, for each
+    index value of each Symbol, with a window function where the database
+    has them.
+
+    Parameters
+    ----------
+    ses : Session
+    which : Override or FailSafe
+    names : list of str
+        Symbol names.
+
+    Returns
+    -------
+    dict of lists of (ind, val) tuples, keyed by Symbol name, in the
+    order they were added.  Symbols without any are left out.
+    """
+    num = which.ornum if which is Override else which.fsnum
+
+    if _has_window_functions(ses.bind.dialect):
+        rnk = func.row_number().over(partition_by=(which.symname, which.ind),
+                                     order_by=(which.dt_log.desc(),
+                                               num.desc()))
+        sub = select([which.symname, which.ind, which.val,
+                      num.label('num'), rnk.label('rnk')])
+        sub = sub.where(which.symname.in_(names)).alias()
+        qry = select([sub.c.symname, sub.c.ind, sub.c.val])
+        qry = qry.where(sub.c.rnk == 1).order_by(sub.c.num)
+        rows = ses.execute(qry).fetchall()
+    else:
+        qry = ses.query(which.symname, which.ind,
+                        func.max(which.dt_log).label('max_dt_log'))
+        qry = qry.filter(which.symname.in_(names))
+        grb = qry.group_by(which.symname, which.ind).subquery()
+
+        qry = ses.query(which.symname, which.ind, which.val)
+        qry = qry.join((grb, and_(which.symname == grb.c.symname,
+                                  which.ind == grb.c.ind,
+                                  which.dt_log == grb.c.max_dt_log)))
+        rows = qry.order_by(num).all()
+
+    orfs = {}
+    for symname, ind, val in rows:
+        orfs.setdefault(symname, []).append((ind, val))
+    return orfs
+
+# Datatable Table objects, shared by every Symbol instance in the process,
+# keyed by database, symbol name, number of feeds, indexing and datadef.
+_datatable_schemas = {}
+
 class SymbolManager(object):
 
     """
@@ -385,17 +473,30 @@ class SymbolManager(object):
         qry = qry.order_by(Symbol.name)
         return qry.all()
 
-    def bulk_cache_of_tag(self, tag):
+    def bulk_cache_of_tag(self, tag, workers=None, mode=None,
+                          source_limits=None, **kwargs):
         """ Caches all the symbols by a certain tag.
 
-        For now, there is no different, than 
-        caching each symbol individually.  In the future,
-        this functionality could have speed improvements.
+        With more than one worker, the Symbols are cached concurrently,
+        each worker using its own session.  Without any, it's no different
+        than caching each symbol individually.
 
         Parameters
         ----------
         tag : str
             Use '%' to enable SQL's "LIKE" functionality.
+        workers : int, optional
+            Size of the thread or process pool.  Defaults to the
+            [bulk] workers setting in trump.cfg, or 1.
+        mode : str, optional
+            'thread' or 'process'.  Defaults to the [bulk] mode setting
+            in trump.cfg, or 'thread'.
+        source_limits : dict, optional
+            Maximum concurrent fetches per source type,
+            eg. {'Quandl' : 2}.  Defaults to the [source_limits] section
+            in trump.cfg.
+        kwargs
+            Passed on to each Symbol's cache(), eg. incremental=True
 
         Returns
         -------
@@ -406,12 +507,145 @@ class SymbolManager(object):
         
         name = 'Bulk Cache of Symbols tagged {}'.format(tag)
         tr = TrumpReport(name)
-        for sym in syms:
-            sr = sym.cache()
+
+        # workers use their own sessions, so they need to see everything.
+        self.ses.commit()
+
+        cacher = BulkCacher(self.ses.bind, workers, mode, source_limits)
+        hits = 0
+        for sr in cacher.cache(syms, **kwargs):
             tr.add_symbolreport(sr)
+            hits += sum(rp.value for rp in sr.reportpoints
+                        if rp.rpoint == 'fetchcache')
+
+        # Feeds served from data fetched once for the whole run.
+        tr.add_reportpoint(ReportPoint('fetchcache', 'hits', hits))
         
         return tr
         
+    def get_panel(self, names_or_tag, batchsize=200):
+        """
+        Gets the final data of many Symbols, as one aligned DataFrame.
+
+        The Symbols are resolved with a single query, and their datatables
+        are read with batched UNION ALL statements, rather than one
+        query per Symbol.
+
+        Parameters
+        ----------
+        names_or_tag : str or list of str
+            Symbol names, aliases, or tags.  Use '%' to enable SQL's
+            "LIKE" functionality.
+        batchsize : int, optional
+            The most datatables to read in a single statement.
+
+        Returns
+        -------
+        DataFrame, with one column per Symbol.  Symbols given by name
+        come first, in the order given, followed by any matched by an
+        alias or tag, sorted by name.
+        """
+
+        if isinstance(names_or_tag, (str, unicode)):
+            keys = [names_or_tag]
+        else:
+            keys = list(names_or_tag)
+
+        crits = []
+        for key in keys:
+            if "%" in key:
+                crits += [Symbol.name.like(key), SymbolAlias.alias.like(key),
+                          SymbolTag.tag.like(key)]
+            else:
+                crits += [Symbol.name == key, SymbolAlias.alias == key,
+                          SymbolTag.tag == key]
+
+        qry = self.ses.query(Symbol).outerjoin(SymbolAlias, Symbol.aliases)
+        qry = qry.outerjoin(SymbolTag, Symbol.tags).filter(or_(*crits))
+        qry = qry.options(joinedload(Symbol.index), joinedload(Symbol.dtype))
+        syms = qry.distinct().order_by(Symbol.name).all()
+
+        def rank(sym):
+            keyed = [i for i, key in enumerate(keys) if key == sym.name]
+            return keyed[0] if keyed else len(keys)
+        syms = sorted(syms, key=rank)
+
+        if len(syms) == 0:
+            return pd.DataFrame()
+
+        names = [sym.name for sym in syms]
+        
+        indkws = {name : {} for name in names}
+        qry = self.ses.query(IndexKwarg).filter(IndexKwarg.symname.in_(names))
+        for indkw in qry:
+            indkws[indkw.symname][indkw.kword] = indkw.val
+
+        # datatables only share a column type within these groups.
+        groups = {}
+        for sym in syms:
+            grp = (sym.index.indimp, sym.dtype.datadef)
+            groups.setdefault(grp, []).append(sym)
+
+        # Symbols never cached have no datatable, and get an empty column.
+        con = self.ses.connection()
+        served = {}
+        for sym in syms:
+            if not con.dialect.has_table(con, sym.name):
+                served[sym.name] = pd.Series(name=sym.name)
+
+        for (indimp, datadef), grpsyms in groups.iteritems():
+            ind_sqlatyp = indexingtypes[indimp].sqlatyp
+            dat_sqlatyp = datadefs[datadef].sqlatyp
+
+            grpsyms = [sym for sym in grpsyms if sym.name not in served]
+            if len(grpsyms) == 0:
+                continue
+
+            longs = []
+            for i in range(0, len(grpsyms), batchsize):
+                subs = []
+                for sym in grpsyms[i:i + batchsize]:
+                    dtbl = table(sym.name, column('indx', ind_sqlatyp),
+                                 column('final', dat_sqlatyp))
+                    subs.append(select([dtbl.c.indx,
+                                        literal(sym.name).label('symbol'),
+                                        dtbl.c.final]))
+                qry = union_all(*subs) if len(subs) > 1 else subs[0]
+                longs.append(pd.read_sql(qry, con))
+            longs = pd.concat(longs, ignore_index=True)
+            
+            byname = dict(list(longs.groupby('symbol')))
+            for sym in grpsyms:
+                sdf = byname.get(sym.name, longs.iloc[:0])
+                sdf = sdf.set_index('indx')[['final']].sort_index()
+                sdf.columns = [sym.name]
+
+                datt = datadefs[datadef]
+                sdf[sym.name] = datt(sdf[sym.name]).converted
+
+                indt = indexingtypes[indimp]
+                indt = indt(sdf, sym.index.case, indkws[sym.name])
+                served[sym.name] = indt.final_series()
+
+        adf = pd.concat([served[name] for name in names], axis=1)
+        adf.index.name = None
+        return adf
+
+    def migrate_reprobjs(self):
+        """
+        Rewrites the override, failsafe and kwarg values stored by older
+        versions of Trump, as repr strings, in the tagged form read by
+        ReprObjType.  Values already in the tagged form are left alone.
+
+        Returns
+        -------
+        int, the number of values rewritten.
+        """
+        migrated = migrate_reprobj_columns(self.ses.connection(),
+                                           Base.metadata)
+        self.ses.commit()
+        return migrated
+
     def build_view_from_tag(self, tag):
         """
         Build a view of group of Symbols based on their tag.
@@ -501,6 +735,7 @@ class SymbolManager(object):
                            fsnum=next_num)
                                              
         self.ses.add(tmp)
+        self.ses.merge(SymbolDirty(symbol, ind))
         self.ses.commit()
         
     def add_override(self, symbol, ind, val, dt_log=None, user=None, comment=None):
@@ -509,6 +744,9 @@ class SymbolManager(object):
         used during the final steps of the aggregation of the datatable.
 
         With default settings Overrides, get applied with highest priority.
+
+        The Symbol's final value picks it up on the next cache, or without
+        re-sourcing any Feeds, via Symbol.refresh_dirty() or reaggregate().
         
         Parameters
         ----------
@@ -553,6 +791,143 @@ class SymbolManager(object):
         """
         self._add_orfs('failsafe', symbol, ind, val, dt_log, user, comment)
 
+    def _bulk_add_orfs(self, which, orfs, dt_log=None, reaggregate=False,
+                       batchsize=500):
+        """
+        Appends many indexed-value pairs, to many symbols, numbering them
+        with a single query, and inserting each symbol's in a single
+        batched statement, all in one transaction.
+
+        See bulk_add_overrides and bulk_add_fail_safes.
+
+        Parameters
+        ----------
+        which : str
+            Fail Safe or Override?
+        orfs : DataFrame
+            With columns symbol, ind and val, and optionally user and
+            comment.  Rows of a symbol are numbered in the order given,
+            so later rows take precedence at the same index value.
+        dt_log : datetime, optional
+            A log entry, for every row, defaults to now.
+        reaggregate : bool, optional
+            Refresh the dirty rows of each affected Symbol afterwards,
+            see Symbol.refresh_dirty().
+        batchsize : int, optional
+            Symbols numbered per query.
+
+        Returns
+        -------
+        dict of symbol name to the number of rows added.
+        """
+        if which.lower() == 'override':
+            orm_class, numcol = Override, 'ornum'
+        elif which.lower() == 'failsafe':
+            orm_class, numcol = FailSafe, 'fsnum'
+        else:
+            raise Exception("Unknown type {}".format(which))
+
+        if not dt_log:
+            dt_log = dt.datetime.now()
+
+        def _col(name):
+            if name not in orfs:
+                return [None] * len(orfs)
+            # tolist() hands back python types, which ReprObjType stores.
+            vals = orfs[name].astype(object)
+            return vals.where(vals.notnull(), None).tolist()
+
+        rows = {}
+        cols = ['symbol', 'ind', 'val', 'user', 'comment']
+        for sym, ind, val, user, comment in zip(*[_col(c) for c in cols]):
+            if not isinstance(sym, (str, unicode)):
+                sym = sym.name
+            rows.setdefault(sym, []).append(dict(symname=sym, ind=ind,
+                                                 val=val, dt_log=dt_log,
+                                                 user=user,
+                                                 comment=comment))
+        names = sorted(rows)
+
+        next_nums = {}
+        dirty = set()
+        num = getattr(orm_class, numcol)
+        for i in range(0, len(names), batchsize):
+            batch = names[i:i + batchsize]
+
+            qry = self.ses.query(orm_class.symname, func.max(num))
+            qry = qry.filter(orm_class.symname.in_(batch))
+            qry = qry.group_by(orm_class.symname)
+            next_nums.update((sym, cur + 1) for sym, cur in qry)
+
+            qry = self.ses.query(SymbolDirty.symname, SymbolDirty.ind)
+            qry = qry.filter(SymbolDirty.symname.in_(batch))
+            dirty.update((sym, encode(ind)) for sym, ind in qry)
+
+        marks = []
+        for sym in names:
+            for n, row in enumerate(rows[sym], next_nums.get(sym, 0)):
+                row[numcol] = n
+                key = (sym, encode(row['ind']))
+                if key not in dirty:
+                    dirty.add(key)
+                    marks.append(dict(symname=sym, ind=row['ind']))
+            self.ses.execute(orm_class.__table__.insert(), rows[sym])
+
+        if len(marks) > 0:
+            self.ses.execute(SymbolDirty.__table__.insert(), marks)
+        self.ses.commit()
+
+        if reaggregate:
+            for sym in names:
+                self.get(sym).refresh_dirty()
+
+        return dict((sym, len(rows[sym])) for sym in names)
+
+    def bulk_add_overrides(self, overrides, dt_log=None, reaggregate=False):
+        """
+        Appends many Overrides, to many symbols, at once.
+
+        Parameters
+        ----------
+        overrides : DataFrame
+            With columns symbol, ind and val, and optionally user and
+            comment, each as in add_override.
+        dt_log : datetime, optional
+            A log entry, for every Override, defaults to now.
+        reaggregate : bool, optional
+            Apply the Overrides to each Symbol's cached data afterwards,
+            without re-sourcing any Feeds.
+
+        Returns
+        -------
+        dict of symbol name to the number of Overrides added.
+        """
+        return self._bulk_add_orfs('override', overrides, dt_log,
+                                   reaggregate)
+
+    def bulk_add_fail_safes(self, fail_safes, dt_log=None,
+                            reaggregate=False):
+        """
+        Appends many FailSafes, to many symbols, at once.
+
+        Parameters
+        ----------
+        fail_safes : DataFrame
+            With columns symbol, ind and val, and optionally user and
+            comment, each as in add_fail_safe.
+        dt_log : datetime, optional
+            A log entry, for every FailSafe, defaults to now.
+        reaggregate : bool, optional
+            Apply the FailSafes to each Symbol's cached data afterwards,
+            without re-sourcing any Feeds.
+
+        Returns
+        -------
+        dict of symbol name to the number of FailSafes added.
+        """
+        return self._bulk_add_orfs('failsafe', fail_safes, dt_log,
+                                   reaggregate)
+
 class ConversionManager(SymbolManager):
     """
     A ConversionManager handles the conversion of previously instantiated
@@ -694,7 +1069,7 @@ class Symbol(Base, ReprMixin):
         self.dtype = SymbolDataDef("SkipDataDef", sym=name)
         
         self.agg_method = agg_method
-        self.datatable = None
+        self._datatable = None
         self.datatable_exists = False
     
     def set_indexing(self, index_template):
@@ -800,7 +1175,8 @@ class Symbol(Base, ReprMixin):
                 setattr(self.handle, checkpoint, settings)
         objs.commit()
 
-    def cache(self, checkvalidity=True):
+    def cache(self, checkvalidity=True, incremental=False, overlap=5,
+              stage=None, fetchcache=None, force_refresh=False, plan=None):
         """ Re-caches the Symbol's datatable by querying each Feed. 
         
         Parameters
@@ -808,93 +1184,86 @@ class Symbol(Base, ReprMixin):
         checkvalidity : bool, optional
             Optionally, check validity post-cache.  Improve speed by
             turning to False.
+        incremental : bool, optional
+            Only fetch the tail of each Feed, merge it into the existing
+            datatable, and upsert the new or changed rows.  Defaults to
+            False, which drops and rebuilds the whole datatable.  A full
+            rebuild is still done if the datatable doesn't exist, or
+            its columns don't match the Symbol's Feeds.
+        overlap : int, optional
+            The number of the datatable's most recent rows to re-fetch,
+            when caching incrementally, so that revisions to recent
+            datapoints get picked up.  Defaults to 5.
+        stage : FetchStage, optional
+            Fetches all the Feeds' data concurrently, before any of it is
+            munged.  By default, a Symbol with more than one Feed uses
+            its own stage, and a single Feed is fetched directly.
+        fetchcache : FetchCache, optional
+            Data fetched ahead of time, eg. by the bulk caching engine,
+            and shared between Feeds.  Feeds it has data for don't fetch
+            their own.  By default, the Symbol uses its own, so Feeds
+            sharing a payload only fetch it once.
+        force_refresh : bool, optional
+            Ignore any snapshots of the Feeds' raw data, see
+            SnapshotStore, and fetch from each source.  Only applies to
+            the Symbol's own FetchCache.  Defaults to False.
+        plan : SymbolPlan, optional
+            The Symbol's configuration, see trump.plans, which the cache
+            runs from.  By default, it's loaded with a fixed number of
+            queries.  Callers caching many Symbols can load every plan
+            at once, with load_plans().
         
         Returns
         -------
         SymbolReport
         """
 
-        data = []
-        cols = ['final', 'override_feed000', 'failsafe_feed999']
-        
-        smrp = SymbolReport(self.name)
-
-        if len(self.feeds) == 0:
-            err_msg = "Symbol has no Feeds. Can't cache a feed-less Symbol."
-            raise Exception(err_msg)
+        if plan is None:
+            plan = load_plan(object_session(self), self.name)
 
-        smrp
-        try:
-            datt = datadefs[self.dtype.datadef]
-            
-            rp = ReportPoint('datadef', 'class', datt)
-            smrp.add_reportpoint(rp)
-            
-            for afeed in self.feeds:
-                fdrp = afeed.cache()
-                smrp.add_feedreport(fdrp)
-                tmp = datt(afeed.data).converted
-                data.append(tmp)
-                cols.append(afeed.data.name)
-        except:
-            point = "caching"
-            smrp = self._generic_exception(point, smrp)
-                
-        try:
-            data = pd.concat(data, axis=1)
-        except:
-            point = "concatenation"
-            smrp = self._generic_exception(point, smrp)
-        
-        indt = indexingtypes[self.index.indimp]
-        indkwargs = self.index.getkwargs()        
-        indt = indt(data, self.index.case, indkwargs)
-        data = indt.final_dataframe()
+        since, existing, smrp = self._cache_start(incremental, overlap)
 
-        data_len = len(data)
-        data['override_feed000'] = [None] * data_len
-        data['failsafe_feed999'] = [None] * data_len
-        
+        driver = object_session(self).bind.driver
 
-        objs = object_session(self)
+        if fetchcache is None:
+            fetchcache = FetchCache(force_refresh=force_refresh)
+            fetchcache.prefetch(plan.source_requests(since), driver)
 
-        qry = objs.query(Override.ind,
-                         func.max(Override.dt_log).label('max_dt_log'))
-        
-        qry = qry.filter_by(symname = self.name)
-        
-        grb = qry.group_by(Override.ind).subquery()
-
-        qry = objs.query(Override)
-        ords = qry.join((grb, and_(Override.ind == grb.c.ind,
-                                   Override.dt_log == grb.c.max_dt_log))).all()
+        data, smrp = plan.run(since, existing, fetchcache, stage, driver, smrp)
 
-        for row in ords:
-            data.loc[row.ind, 'override_feed000'] = row.val
+        return self._write_cache(data, smrp, plan, since, existing,
+                                 checkvalidity)
 
-        qry = objs.query(FailSafe.ind,
-                         func.max(FailSafe.dt_log).label('max_dt_log'))
-                         
-        qry = qry.filter_by(symname = self.name)
-                         
-        grb = qry.group_by(FailSafe.ind).subquery()
+    def _cache_start(self, incremental=False, overlap=5):
+        """
+        Returns
+        -------
+        tuple of the index value to cache from, the existing datatable,
+        both None unless caching incrementally, and the SymbolReport.
+        """
+        smrp = SymbolReport(self.name)
 
-        qry = objs.query(FailSafe)
-        ords = qry.join((grb, and_(FailSafe.ind == grb.c.ind,
-                                   FailSafe.dt_log == grb.c.max_dt_log))).all()
+        since = None
+        existing = None
+        if incremental:
+            since = self._incremental_start(overlap)
+            rp = ReportPoint('incremental', 'since', since)
+            smrp.add_reportpoint(rp)
+            if since is not None:
+                existing = self._datatable_frame()
 
-        for row in ords:
-            data.loc[row.ind, 'failsafe_feed999'] = row.val
-            
-        try:
-            data = data.fillna(value=pd.np.nan)
-            data = data[sorted_feed_cols(data)]
-            data['final'] = FeedAggregator(self.agg_method).aggregate(data)
-        except:
-            point = "aggregation"
-            smrp = self._generic_exception(point, smrp)
+        return since, existing, smrp
 
+    def _write_cache(self, data, smrp, plan, since=None, existing=None,
+                     checkvalidity=True):
+        """
+        Writes the data, from SymbolPlan.run(), to the datatable, and
+        checks the Symbol's validity.
 
+        Returns
+        -------
+        SymbolReport
+        """
         # SQLAQ There are several states to deal with at this point
         # A) the datatable exists but a feed has been added
         # B) the datatable doesn't exist and needs to be created
@@ -914,15 +1283,28 @@ class Symbol(Base, ReprMixin):
         # Is this the best way to check?
         # if engine.dialect.has_table(session.connection(), self.name):
         #    delete(self.datatable).execute()
-        self._refresh_datatable_schema()
-
-        data.index.name = 'indx'
-        data = data.reset_index()
-        datarecords = data.to_dict(orient='records')
-        
         objs = object_session(self)
-        objs.execute(self.datatable.insert(), datarecords)
-        objs.commit()
+
+        # only the Overrides and FailSafes the plan held have just been
+        # applied, any added since it was loaded stay marked dirty.
+        newer = self._orfs_newer_than(plan)
+
+        if since is None:
+            self._refresh_datatable_schema()
+
+        # the marks are cleared in the same transaction as the write.
+        qry = objs.query(SymbolDirty).filter_by(symname=self.name)
+        if len(newer) > 0:
+            qry = qry.filter(~SymbolDirty.ind.in_(newer))
+        qry.delete(synchronize_session=False)
+
+        if since is None:
+            writer_for(objs.bind).write(objs, self.datatable, data)
+            objs.commit()
+        else:
+            upserts = self._upsert_datatable(data, existing)
+            rp = ReportPoint('incremental', 'rows written', upserts)
+            smrp.add_reportpoint(rp)
 
         if checkvalidity:
             try:
@@ -933,7 +1315,7 @@ class Symbol(Base, ReprMixin):
                     raise Exception('{} is not valid'.format(self.name))
             except:
                 point = "validity_check"
-                smrp = self._generic_exception(point, smrp)
+                smrp = plan.handle_exception(point, smrp)
         
         return smrp
 
@@ -1124,21 +1506,6 @@ class Symbol(Base, ReprMixin):
             self.aliases.append(a)
             objs.add(a)
 
-    def _final_data(self):
-        """
-        Returns
-        -------
-        A list of tuples representing rows from the datatable's index
-        and final column, sorted accordingly.
-        """
-        dtbl = self.datatable
-
-        objs = object_session(self)
-        if isinstance(dtbl, Table):
-            return objs.query(dtbl.c.indx, dtbl.c.final).all()
-        else:
-            raise Exception("Symbol has no datatable")
-
     def _all_datatable_data(self):
         """
         Returns
@@ -1165,15 +1532,33 @@ class Symbol(Base, ReprMixin):
         -------
             Dataframe of the symbol's final data.
         """
-        data = self._final_data()
+        return self.get_df()
 
-        adf = pd.DataFrame(data)
-        adf.columns = [self.index.name, self.name]
+    def get_df(self, start=None, end=None, last_n=None):
+        """
+        Returns a window of the symbol's final data.  The window is
+        applied in the database, and the index implementer is only run
+        over the rows returned.
+        
+        Parameters
+        ----------
+        start : obj, optional
+            The first index value to include.
+        end : obj, optional
+            The last index value to include.
+        last_n : int, optional
+            Only return the last_n rows, of those within start and end.
+        
+        Returns
+        -------
+            Dataframe of the symbol's final data.
+        """
+        adf = self._read_datatable(['final'], start, end, last_n)
+        adf.columns = [self.name]
+        adf.index.name = self.index.name
         
         datt = datadefs[self.dtype.datadef]       
         adf[self.name] = datt(adf[self.name]).converted
-        
-        adf = adf.set_index(self.index.name)
 
         indt = indexingtypes[self.index.indimp]
         indt = indt(adf, self.index.case, self.index.getkwargs())
@@ -1187,17 +1572,10 @@ class Symbol(Base, ReprMixin):
     @property
     def datatable_df(self):
         """ returns the dataframe representation of the symbol's final data """
-        data = self._all_datatable_data()
-        adf = pd.DataFrame(data)
-        
-        adf.columns = self.dt_all_cols
+        adf = self._read_datatable()
         
         datt = datadefs[self.dtype.datadef]
-        
-        for col in adf.columns:
-            adf[col] = datt(adf[col]).converted
-        
-        adf = adf.set_index('indx')
+        adf = datt(adf).converted
 
         indt = indexingtypes[self.index.indimp]
         indt = indt(adf, self.index.case, self.index.getkwargs())
@@ -1209,6 +1587,58 @@ class Symbol(Base, ReprMixin):
             adf.index.name = self.index.name
             
         return adf
+
+    def _read_datatable(self, columns=None, start=None, end=None,
+                        last_n=None, inds=None):
+        """
+        Reads the datatable straight into a DataFrame, through
+        pandas.read_sql, rather than building ORM rows first.
+
+        Parameters
+        ----------
+        columns : list of str, optional
+            The columns to read, other than indx.  Defaults to all.
+        start : obj, optional
+            Only read rows with an index value at, or after, start.
+        end : obj, optional
+            Only read rows with an index value at, or before, end.
+        last_n : int, optional
+            Only read the last_n rows, of those within start and end.
+        inds : list, optional
+            Only read rows with these index values.  Each is a bound
+            parameter, so long lists should be read in batches.
+
+        Returns
+        -------
+        DataFrame, indexed and sorted by indx, without any datadef
+        or index implementer logic applied.
+        """
+        dtbl = self.datatable
+
+        if not isinstance(dtbl, Table):
+            raise Exception("Symbol has no datatable")
+
+        if columns is None:
+            columns = [c.name for c in dtbl.columns if c.name != 'indx']
+
+        qry = select([dtbl.c.indx] + [dtbl.c[col] for col in columns])
+        if start is not None:
+            qry = qry.where(dtbl.c.indx >= start)
+        if end is not None:
+            qry = qry.where(dtbl.c.indx <= end)
+        if inds is not None:
+            qry = qry.where(dtbl.c.indx.in_(list(inds)))
+
+        if last_n is not None:
+            qry = qry.order_by(dtbl.c.indx.desc()).limit(last_n)
+        else:
+            qry = qry.order_by(dtbl.c.indx)
+
+        objs = object_session(self)
+        adf = pd.read_sql(qry, objs.connection(), index_col='indx')
+        if last_n is not None:
+            adf = adf.iloc[::-1]
+        return adf
         
     def del_feed(self):
         """ remove a feed """
@@ -1227,26 +1657,268 @@ class Symbol(Base, ReprMixin):
         """ change the symbol's units """
         self.units = units
 
-    def _init_datatable(self):
+    @property
+    def datatable(self):
         """
-        Instantiates the .datatable attribute, pointing to a table in the
-        database that stores all the cached data
+        The SQLAlchemy Table storing all the cached data.  It's built on
+        first access, rather than reflected when the Symbol is loaded, and
+        is shared with any other instance of the same Symbol in the process.
+        The table gets created, if it doesn't exist yet.
         """
-        try:
-            self.datatable = Table(self.name, Base.metadata, autoload=True)
-        except NoSuchTableError:
-            print "Creating datatable, cause it doesn't exist"
-            self.datatable = self._datatable_factory()
-            self.datatable.create()
+        if getattr(self, '_datatable', None) is None:
+            key = self._datatable_key()
+            dtbl = _datatable_schemas.get(key)
+            if dtbl is None:
+                dtbl = self._datatable_factory()
+                dtbl.create(bind=object_session(self).bind, checkfirst=True)
+                _datatable_schemas[key] = dtbl
+            self._set_datatable(dtbl)
+        return self._datatable
+
+    def _datatable_key(self):
+        bind = object_session(self).bind
+        return (str(bind.url), self.name, self.n_feeds,
+                self.index.indimp, self.dtype.datadef)
+
+    def _set_datatable(self, dtbl):
+        self._datatable = dtbl
+        self.dt_all_cols = [col.name for col in dtbl.columns]
+        self.dt_feed_cols = self.dt_all_cols[2:]
         self.datatable_exists = True
 
+    def _init_datatable(self):
+        """
+        Forgets the .datatable attribute, so it's rebuilt on next access,
+        eg. after another session has changed the Symbol's feeds.
+        """
+        self._datatable = None
+
     def _refresh_datatable_schema(self):
         objs = object_session(self)
-        self.datatable = self._datatable_factory()
-        self.datatable.drop(checkfirst=True)
-        self.datatable.create()
-        self.datatable_exists = True
+        dtbl = self._datatable_factory()
+        dtbl.drop(bind=objs.bind, checkfirst=True)
+        dtbl.create(bind=objs.bind)
+        _datatable_schemas[self._datatable_key()] = dtbl
+        self._set_datatable(dtbl)
+        objs.commit()
+
+    def _orfs_newer_than(self, plan):
+        """
+        Returns
+        -------
+        list of the index values, where the latest Override or FailSafe
+        isn't the one the SymbolPlan was loaded with.
+        """
+        objs = object_session(self)
+
+        newer = []
+        for which, held in ((Override, plan.overrides),
+                            (FailSafe, plan.failsafes)):
+            held = dict(held)
+            rows = latest_orfs(objs, which, [self.name]).get(self.name, [])
+            newer += [ind for ind, val in rows
+                      if ind not in held or held[ind] != val]
+        return newer
+
+    def refresh_dirty(self, batchsize=500):
+        """
+        Recomputes the final value of only the index values marked dirty,
+        by add_override() and add_fail_safe(), and writes just those rows
+        of the datatable, without fetching any Feeds.
+
+        Aggregators that aren't row-wise, eg. most_populated, pick a feed
+        from every row, so for those the whole datatable is aggregated
+        again, see reaggregate().
+
+        Parameters
+        ----------
+        batchsize : int, optional
+            Index values read per query.
+
+        Returns
+        -------
+        int, the number of rows inserted or updated, or None if the
+        Symbol needs a full cache instead, because its datatable doesn't
+        exist, or has columns that don't match the Symbol's Feeds.
+        """
+        objs = object_session(self)
+
+        dirty = objs.query(SymbolDirty).filter_by(symname=self.name).all()
+        if len(dirty) == 0:
+            return 0
+
+        if not FeedAggregator(self.agg_method).rowwise:
+            return self.reaggregate()
+
+        if self._incremental_start(1) is None:
+            return None
+
+        inds = [drt.ind for drt in dirty]
+        if self.index.indimp == 'DatetimeIndexImp':
+            # marks hold whatever was passed to add_override, eg. dates.
+            inds = list(pd.to_datetime(inds).to_pydatetime())
+
+        existing = [self._datatable_frame(inds[i:i + batchsize])
+                    for i in range(0, len(inds), batchsize)]
+        existing = pd.concat(existing)
+
+        marked = set(drt.ind for drt in dirty)
+        return self._reaggregate(existing, marked)
+
+    def reaggregate(self):
+        """
+        Rebuilds the final column from the Feed columns already stored
+        in the datatable, and the current Overrides and FailSafes, and
+        writes back only the rows that changed, without fetching any
+        Feeds.  Use it after adding Overrides or FailSafes, or changing
+        the agg_method.
+
+        Returns
+        -------
+        int, the number of rows inserted or updated, or None if the
+        Symbol needs a full cache instead, because its datatable doesn't
+        exist, or has columns that don't match the Symbol's Feeds.
+        """
+        if self._incremental_start(1) is None:
+            return None
+        return self._reaggregate(self._datatable_frame())
+
+    def _reaggregate(self, existing, marked=None):
+        """
+        Applies the latest Overrides and FailSafes to rows of the
+        datatable, aggregates them again, clears the Symbol's dirty
+        marks and upserts the result, in one transaction.
+
+        Parameters
+        ----------
+        existing : DataFrame
+            Rows of the datatable, from _datatable_frame()
+        marked : set, optional
+            Only apply Overrides and FailSafes at these index values,
+            by default, all of them are applied.
+
+        Returns
+        -------
+        int, the number of rows inserted or updated.
+        """
+        objs = object_session(self)
+
+        # index values without a row yet, are added by apply_orfs.
+        data = existing.drop('final', axis=1)
+        for col, which in (('override_feed000', Override),
+                           ('failsafe_feed999', FailSafe)):
+            rows = latest_orfs(objs, which, [self.name]).get(self.name, [])
+            if marked is not None:
+                rows = [(ind, val) for ind, val in rows if ind in marked]
+            data = apply_orfs(data, col, rows)
+
+        data = data.fillna(value=pd.np.nan)
+        data = data[sorted_feed_cols(data)]
+        data['final'] = FeedAggregator(self.agg_method).aggregate(data)
+
+        qry = objs.query(SymbolDirty).filter_by(symname=self.name)
+        if marked is not None:
+            qry = qry.filter(SymbolDirty.ind.in_(list(marked)))
+        qry.delete(synchronize_session=False)
+
+        return self._upsert_datatable(data, existing)
+
+    def _incremental_start(self, overlap):
+        """
+        Finds the index value an incremental cache should start fetching
+        from, which is the overlap'th most recent row of the datatable.
+
+        Returns
+        -------
+        The index value, or None if the datatable needs to be rebuilt,
+        because it doesn't exist, has too few rows, or has columns that
+        don't match the Symbol's Feeds.
+        """
+        objs = object_session(self)
+
+        # checks just this table, rather than listing every table.
+        con = objs.connection()
+        if not con.dialect.has_table(con, self.name):
+            return None
+        insp = inspect(con)
+        existing_cols = set(c['name'] for c in insp.get_columns(self.name))
+
+        # feeds may have been added, since the datatable was last built.
+        self._init_datatable()
+        dtbl = self.datatable
+        if existing_cols != set(self.dt_all_cols):
+            return None
+
+        qry = objs.query(dtbl.c.indx).order_by(dtbl.c.indx.desc())
+        row = qry.offset(max(overlap - 1, 0)).first()
+        if row is None:
+            return None
+        return row[0]
+
+    def _datatable_frame(self, inds=None):
+        """
+        Parameters
+        ----------
+        inds : list, optional
+            Only read rows with these index values.
+
+        Returns
+        -------
+        DataFrame of all the datatable's columns, indexed by indx, with
+        the datadef conversion applied to the non-null cells, but not the
+        index implementer.
+        """
+        adf = self._read_datatable(self.dt_all_cols[1:], inds=inds)
+        datt = datadefs[self.dtype.datadef]
+
+        # NULLs stay NaN, as they are after caching, rather than being
+        # converted, eg. to the string 'None' by a StrDataDef.
+        for col in adf.columns:
+            vals = adf[col].dropna()
+            adf[col] = datt(vals).converted.reindex(adf.index)
+        return adf
+
+    def _upsert_datatable(self, data, existing):
+        """
+        Writes only the rows of data that are new, or differ from the
+        existing datatable, and deletes rows that are no longer present.
+
+        Returns
+        -------
+        int, the number of rows inserted, updated or deleted.
+        """
+        cols = self.dt_all_cols[1:]
+        data = data[cols]
+        existing = existing[cols]
+
+        common = data.index.intersection(existing.index)
+        new = data.index.difference(existing.index)
+        gone = existing.index.difference(data.index)
+
+        left = data.loc[common]
+        right = existing.loc[common]
+        same = (left == right) | (left.isnull() & right.isnull())
+        changed = common[~same.all(axis=1).values]
+
+        dtbl = self.datatable
+        objs = object_session(self)
+        writer = writer_for(objs.bind)
+
+        if len(gone) > 0:
+            objs.execute(dtbl.delete().where(dtbl.c.indx.in_(list(gone))))
+
+        if len(changed) > 0:
+            upd = dtbl.update().where(dtbl.c.indx == bindparam('b_indx'))
+            chg = data.loc[changed]
+            chg.index.name = 'b_indx'
+            for chunk in writer.chunks(chg):
+                objs.execute(upd, chunk.reset_index().to_dict(orient='records'))
+
+        if len(new) > 0:
+            writer.write(objs, dtbl, data.loc[new])
+
         objs.commit()
+        return len(gone) + len(changed) + len(new)
 
     def _datatable_factory(self):
         """
@@ -1259,30 +1931,21 @@ class Symbol(Base, ReprMixin):
         ind_sqlatyp = indexingtypes[self.index.indimp].sqlatyp
         dat_sqlatyp = datadefs[self.dtype.datadef].sqlatyp
 
-        atbl = Table(self.name, Base.metadata,
+        atbl = Table(self.name, MetaData(),
                      Column('indx', ind_sqlatyp, primary_key=True),
                      Column('final', dat_sqlatyp),
-                     *(Column(fed_col, dat_sqlatyp) for fed_col in feed_cols),
-                     extend_existing=True)
+                     *(Column(fed_col, dat_sqlatyp) for fed_col in feed_cols))
         
         self.dt_feed_cols = feed_cols[:]
         self.dt_all_cols = ['indx', 'final'] + feed_cols[:]
         return atbl
-    def _generic_exception(self, point, reporter):
-        logic = getattr(self.handle, point)
-        msg = "Exception at the point of {} for {}"
-        msg = msg.format(point, self.name)
-        hdlrp = Handler(logic, point, msg).process()
-        if hdlrp:
-            reporter.add_handlepoint(hdlrp)
-        return reporter
     @property
     def meta_map(self):
         return ProxyDict(self, 'meta', SymbolMeta, 'attr')
         
 @event.listens_for(Symbol, 'load')
 def __receive_load(target, context):
-    """ loads a symbols datatable upon being queried """
+    """ defers building a symbol's datatable until it's first used """
     target._init_datatable()
 
 
@@ -1615,165 +2278,55 @@ class Feed(Base, ReprMixin):
         objs.add_all(tmps)
         objs.commit()
 
-    def cache(self):
-        
-        fdrp = FeedReport(self.fnum)
-
-        src = self.sourcing.one()
-        srckeys = src.sourcing_map.keys()
-        kwargs = {k: src.sourcing_map[k].val for k in srckeys}
-               
-        sourcing_key = src.sourcing_key
-        stype = src.stype
-
-        # If there is a sourcing key defined, use it to override any database
-        # defined parameters
-        if sourcing_key:
-            sourcing_overrides = read_settings()[stype][sourcing_key]
-            for key in sourcing_overrides:
-                kwargs[key] = sourcing_overrides[key]
-
-        rp = ReportPoint('readmeta', 'sourcing', stype, str(kwargs))
-        fdrp.add_reportpoint(rp)
-        
-        try:
-            # Depending on the feed type, use the kwargs appropriately to
-            # populate a dataframe, self.data.
-
-            # For development of the handler, raise an exception...
-            # raise Exception("There was a problem of somekind!")
-
-            if stype == 'Quandl':
-                import Quandl as q
-                self.data = q.get(**kwargs)
-                try:
-                    fn = kwargs['fieldname']
-                except KeyError:
-                    raise KeyError("fieldname wasn't specified in Quandl Feed")
-
-                try:
-                    self.data = self.data[fn]
-                except KeyError:
-                    kemsg = """{} was not found in list of Quandle headers:\n
-                             {}""".format(fn, str(self.data.columns))
-                    raise KeyError(kemsg)
-
-            elif stype == 'psycopg2':
-                dbargs = ['dsn', 'user', 'password', 'host', 'database', 'port']
-                import psycopg2 as db
-                con_kwargs = {k: v for k, v in kwargs.items() if k in dbargs}
-                con = db.connect(**con_kwargs)
-                raise NotImplementedError("pyscopg2")
-            elif stype == 'DBAPI':
-                dbargs = ['dsn', 'user', 'password', 'host', 'database', 'port']
-                db = __import__(self.ses.bind.driver)
-                con_kwargs = {k: v for k, v in kwargs.items() if k in dbargs}
-
-                con = db.connect(**con_kwargs)
-                cur = con.cursor()
-
-                if kwargs['dbinstype'] == 'COMMAND':
-                    qry = kwargs['command']
-                elif kwargs['dbinstype'] == 'KEYCOL':
-                    reqd = ['indexcol', 'datacol', 'table', 'keycol', 'key']
-                    rel = (kwargs[c] for c in reqd)
-                    qry = "SELECT {0},{1} FROM {2} WHERE {3} = '{4}' ORDER BY {0};"
-                    qry = qry.format(*rel)
-                else:
-                    raise NotImplementedError("The database type {} has not been created.".format(kwargs['dbinstype']))
-                   
-                cur.execute(qry)
-                    
-                results = [(row[0], row[1]) for row in cur.fetchall()]
-                con.close()
-                ind, dat = zip(*results)
-                self.data = pd.Series(dat, ind)
-            elif stype == 'SQLAlchemy':
-                NotImplementedError("SQLAlchemy")
-            elif stype == 'PyDataCSV':
-                from pandas import read_csv
-
-                col = kwargs['data_column']
-                del kwargs['data_column']
-                
-                fpob = kwargs['filepath_or_buffer']
-                del kwargs['filepath_or_buffer']
-                
-                df = read_csv(fpob, **kwargs)
-                
-                self.data = df[col]
+    def cache(self, since=None, fetchcache=None):
+        """
+        Fetches and munges the Feed's data, storing it in .data
 
-            elif stype == 'PyDataDataReaderST':
-                import pandas.io.data as pydata
+        Parameters
+        ----------
+        since : obj, optional
+            An index value, used by incremental caching.  When the Feed
+            has no munging, and the source supports it, only data from
+            this date onward is requested.  Otherwise, the full series
+            is fetched, and left to the Symbol to truncate.
+        fetchcache : FetchCache, optional
+            Data fetched ahead of time, or by other Feeds in the same run.
+            If it has this Feed's data, or payload, it's used instead of
+            fetching.
 
-                fmt = "%Y-%m-%d"
-                if 'start' in kwargs:
-                    kwargs['start'] = dt.datetime.strptime(kwargs['start'], fmt)
-                if 'end' in kwargs:
-                    if kwargs['end'] == 'now':
-                        kwargs['end'] = dt.datetime.now()
-                    else:
-                        kwargs['end'] = dt.datetime.strptime(kwargs['end'], fmt)
+        Returns
+        -------
+        FeedReport
+        """
+        pending = getattr(self, '_pending', None)
+        self._pending = None
 
-                col = kwargs['data_column']
-                del kwargs['data_column']
+        fdrp, self.data = self.plan.cache(since, fetchcache,
+                                          self.ses.bind.driver, pending)
+        return fdrp
 
-                adf = pydata.DataReader(**kwargs)
-                self.data = adf[col]
+    def request(self, stage, since=None, fetchcache=None):
+        """
+        Starts fetching the Feed's data on a FetchStage, so that it runs
+        concurrently with other fetches.  The next call to cache() waits
+        for it, rather than fetching.
 
-            else:
-                raise Exception("Unknown Source Type : {}".format(stype))
-        except:
-            point = "api_failure"
-            fdrp = self._generic_exception(point, fdrp)
-            self.data = pd.Series()
-
-        try:
-            if len(self.data) == 0 or self.data.empty:
-                raise Exception('Feed is empty')
-        except:
-            point = "empty_feed"
-            fdrp = self._generic_exception(point, fdrp)
-
-        try:
-            if not (self.data.index.is_monotonic and self.data.index.is_unique):
-                dtstr = str(self.data)
-                indstr = str(self.data.index)
-                msg = 'Feed index is not uniquely monotonic:' + dtstr + indstr
-                raise Exception(msg)
-        except:
-            point = "monounique"
-            fdrp = self._generic_exception(point, fdrp)
-
-        # munge accordingly
-        print "Munging..."
-        
-        print self.data.tail(5)
-        
-        for mgn in self.munging:
-            #print mgn
-            #print mgn.munging_map.keys()
-            mmkeys = mgn.munging_map.keys()
-            kwargs = {k: mgn.munging_map[k].val for k in mmkeys}
-            if mgn.mtype == pab:
-                afunc = getattr(self.data, mgn.method)
-                self.data = afunc(**kwargs)
-            elif mgn.mtype == pnab:
-                lib = __import__('pandas', globals(), locals(), [], -1)
-                afunc = getattr(lib, mgn.method)
-                self.data = afunc(self.data, **kwargs)
-
-        # make sure it's named properly...
-        self.data.name = "feed" + str(self.fnum + 1).zfill(3)
-
-        rp = ReportPoint('finish', 'cache', True, self.data.tail(3))
-        fdrp.add_reportpoint(rp)
-        
-        return fdrp
+        Parameters
+        ----------
+        stage : FetchStage
+        since : obj, optional
+            See cache().
+        fetchcache : FetchCache, optional
+            See cache().
+        """
+        self._pending = self.plan.request(stage, since, fetchcache,
+                                          self.ses.bind.driver)
 
-#            for a in mgn.methodargs:
-#                args[a.arg] = a.value
-#            self.data = munging_methods[mgn.method](self.data,**args)
+    @property
+    def plan(self):
+        """ The Feed's FeedPlan, see trump.plans """
+        splan = load_plan(self.ses, self.symname)
+        return [fplan for fplan in splan.feeds if fplan.fnum == self.fnum][0]
 
     @property
     def meta_map(self):
@@ -1782,14 +2335,6 @@ class Feed(Base, ReprMixin):
     @property
     def source(self):
         return " ".join([p.key + " : " + p.value for p in self.sourcing])
-    def _generic_exception(self, point, reporter):
-        logic = getattr(self.handle, point)
-        msg = "Exception for feed #{} for {} at the {} point."
-        msg = msg.format(self.fnum, self.symname, point)
-        hdlrp = Handler(logic, point, msg).process()
-        if hdlrp:
-            reporter.add_handlepoint(hdlrp)
-        return reporter
     def _note_session(self):
         self.ses = object_session(self)
 
@@ -2087,6 +2632,25 @@ class FailSafe(Base, ReprMixin):
     def __init__(self, *args, **kwargs):
         super(FailSafe, self).__init__(*args, **kwargs)
 
+class SymbolDirty(Base, ReprMixin):
+    """
+    A SymbolDirty marks an index value of a Symbol whose final value is
+    out of date, because an Override or FailSafe was added there since
+    the Symbol was last cached.  See Symbol.refresh_dirty().
+    """
+    __tablename__ = '_symbol_dirty'
+
+    symname = Column('symname', String, ForeignKey('_symbols.name', **CC),
+                     primary_key=True)
+    """ symbol name, of the dirty index value"""
+
+    ind = Column('ind', ReprObjType, primary_key=True)
+    """ the repr of the object used in the Symbol's index."""
+
+    def __init__(self, symname, ind):
+        self.symname = symname
+        self.ind = ind
+
 def SetupTrump(engine_string=None):
     
     engine_str = engine_string or ENGINE_STR
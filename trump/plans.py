@@ -0,0 +1,527 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+
+"""
+A plan is an immutable, in-memory copy of the configuration needed to cache
+a Symbol: its Feeds' sourcing, munging and handles, its index, datadef and
+aggregation method, and its latest Overrides and FailSafes.  load_plans()
+reads the plans of many Symbols with a fixed number of queries, where
+walking the ORM's dynamic relationships costs a query per kwarg, per Feed.
+
+Plans are picklable, and SymbolPlan.run() needs no Session, so a plan can
+be run in another process, which only has to send back the final
+DataFrame and the SymbolReport.
+"""
+
+from collections import namedtuple
+import datetime as dt
+
+import pandas as pd
+
+from trump.options import read_settings, read_config
+from trump.sourcing import fetch, source_slot, FetchStage
+from trump.tools import BitFlag
+from trump.handling import Handler
+from trump.indexing import indexingtypes
+from trump.datadef import datadefs
+from trump.extensions.symbol_aggs import FeedAggregator, sorted_feed_cols
+from trump.reporting.objects import FeedReport, SymbolReport, ReportPoint
+
+
+def _handle_exception(handle, point, msg, reporter):
+    """ runs the Handler of a handle point, and reports what it did """
+    logic = BitFlag(dict(handle)[point])
+    hdlrp = Handler(logic, point, msg).process()
+    if hdlrp:
+        reporter.add_handlepoint(hdlrp)
+    return reporter
+
+
+_FeedPlan = namedtuple('FeedPlan', ['symname', 'fnum', 'stype', 'kwargs',
+                                    'munging', 'handle'])
+
+class FeedPlan(_FeedPlan):
+
+    """
+    The configuration of a Feed, as loaded by load_plans().
+
+    Attributes
+    ----------
+    symname : str
+    fnum : int
+    stype : str
+        The source type.
+    kwargs : tuple of (str, obj) tuples
+        The sourcing kwargs, with any sourcing_key settings applied.
+    munging : MungingPipeline
+    handle : tuple of (str, int) tuples
+        Each handle point, and the value of its BitFlag.
+    """
+
+    __slots__ = ()
+
+    @property
+    def colname(self):
+        return "feed" + str(self.fnum + 1).zfill(3)
+
+    def source_kwargs(self, since, fdrp):
+        """
+        Returns
+        -------
+        tuple of the source type, and a new dict of the kwargs to fetch
+        with.
+        """
+        kwargs = dict(self.kwargs)
+
+        if since is not None:
+            if self.push_down_since(kwargs, since):
+                rp = ReportPoint('readmeta', 'since', since)
+                fdrp.add_reportpoint(rp)
+
+        rp = ReportPoint('readmeta', 'sourcing', self.stype, str(kwargs))
+        fdrp.add_reportpoint(rp)
+        return self.stype, kwargs
+
+    def push_down_since(self, kwargs, since):
+        """
+        Restricts the sourcing kwargs, in place, to request data from
+        since onward.  Munging needs the full history, and only date-like
+        index values can be pushed to the sources, so any other case is
+        left alone.
+
+        Returns
+        -------
+        bool, True if the kwargs were restricted.
+        """
+        if not isinstance(since, dt.date) or len(self.munging) > 0:
+            return False
+
+        since = since.strftime("%Y-%m-%d")
+
+        if self.stype == 'Quandl':
+            kwargs['trim_start'] = max(kwargs.get('trim_start', since), since)
+        elif self.stype == 'PyDataDataReaderST':
+            kwargs['start'] = max(kwargs.get('start', since), since)
+        elif self.stype == 'DBAPI' and kwargs.get('dbinstype') == 'KEYCOL':
+            kwargs['since'] = since
+        else:
+            return False
+        return True
+
+    def request(self, stage, since=None, fetchcache=None, driver=None):
+        """
+        Starts fetching the Feed's data on a FetchStage.
+
+        Returns
+        -------
+        tuple of the FeedReport, and the PendingFetch to pass to cache().
+        """
+        fdrp = FeedReport(self.fnum)
+        stype, kwargs = self.source_kwargs(since, fdrp)
+        return fdrp, stage.submit(stype, kwargs, driver, fetchcache)
+
+    def cache(self, since=None, fetchcache=None, driver=None, pending=None):
+        """
+        Fetches and munges the Feed's data, see Feed.cache().
+
+        Parameters
+        ----------
+        since : obj, optional
+        fetchcache : FetchCache, optional
+        driver : str, optional
+            The name of the DBAPI module, used by DBAPI Feeds.
+        pending : tuple, optional
+            As returned by request(), to wait on instead of fetching.
+
+        Returns
+        -------
+        tuple of the FeedReport, and the Feed's data.
+        """
+        if pending is None:
+            fdrp = FeedReport(self.fnum)
+            stype, kwargs = self.source_kwargs(since, fdrp)
+        else:
+            fdrp, pending = pending
+
+        cached = None
+        try:
+            # Depending on the feed type, use the kwargs appropriately to
+            # populate a dataframe, data.
+            if pending is not None:
+                data = pending.result()
+                cached = pending.cached
+            elif fetchcache is not None:
+                data, cached = fetchcache.fetch(stype, kwargs, driver)
+            else:
+                with source_slot(stype):
+                    data = fetch(stype, kwargs, driver)
+        except:
+            point = "api_failure"
+            fdrp = self.handle_exception(point, fdrp)
+            data = pd.Series()
+
+        if cached is not None:
+            rp = ReportPoint('readmeta', 'fetchcache', cached)
+            fdrp.add_reportpoint(rp)
+
+        try:
+            if len(data) == 0 or data.empty:
+                raise Exception('Feed is empty')
+        except:
+            point = "empty_feed"
+            fdrp = self.handle_exception(point, fdrp)
+
+        try:
+            if not (data.index.is_monotonic and data.index.is_unique):
+                dtstr = str(data)
+                indstr = str(data.index)
+                msg = 'Feed index is not uniquely monotonic:' + dtstr + indstr
+                raise Exception(msg)
+        except:
+            point = "monounique"
+            fdrp = self.handle_exception(point, fdrp)
+
+        # munge accordingly
+        data = self.munging(data)
+
+        # make sure it's named properly...
+        data.name = self.colname
+
+        rp = ReportPoint('finish', 'cache', True, data.tail(3))
+        fdrp.add_reportpoint(rp)
+
+        return fdrp, data
+
+    def handle_exception(self, point, reporter):
+        msg = "Exception for feed #{} for {} at the {} point."
+        msg = msg.format(self.fnum, self.symname, point)
+        return _handle_exception(self.handle, point, msg, reporter)
+
+
+def apply_orfs(data, col, rows):
+    """
+    Sets the column of data to the latest Overrides or FailSafes, in a
+    single assignment, adding any index values data doesn't have.
+
+    Parameters
+    ----------
+    data : DataFrame
+    col : str
+    rows : list of (ind, val) tuples
+
+    Returns
+    -------
+    DataFrame
+    """
+    if len(rows) == 0:
+        data[col] = pd.np.nan
+        return data
+
+    inds, vals = zip(*rows)
+    if isinstance(data.index, pd.DatetimeIndex):
+        inds = pd.to_datetime(list(inds))
+    orfs = pd.Series(vals, index=inds)
+    orfs = orfs[~orfs.index.duplicated(keep='last')]
+
+    missing = orfs.index.difference(data.index)
+    if len(missing) > 0:
+        data = data.reindex(data.index.union(missing))
+
+    data[col] = orfs.reindex(data.index)
+    return data
+
+
+_SymbolPlan = namedtuple('SymbolPlan', ['name', 'agg_method', 'datadef',
+                                        'indimp', 'case', 'index_kwargs',
+                                        'handle', 'feeds', 'overrides',
+                                        'failsafes'])
+
+class SymbolPlan(_SymbolPlan):
+
+    """
+    The configuration of a Symbol, as loaded by load_plans().
+
+    Attributes
+    ----------
+    name : str
+    agg_method : str
+    datadef : str
+        The name of the Symbol's DataDef, see trump.datadef.
+    indimp : str
+        The name of the Symbol's IndexImplementer, see trump.indexing.
+    case : str
+    index_kwargs : tuple of (str, obj) tuples
+    handle : tuple of (str, int) tuples
+        Each handle point, and the value of its BitFlag.
+    feeds : tuple of FeedPlan
+        In order of fnum.
+    overrides : tuple of (obj, obj) tuples
+        The latest Override value, for each index value, as of when the
+        plan was loaded.
+    failsafes : tuple of (obj, obj) tuples
+        The latest FailSafe value, for each index value.
+    """
+
+    __slots__ = ()
+
+    def run(self, since=None, existing=None, fetchcache=None, stage=None,
+            driver=None, smrp=None):
+        """
+        Fetches, munges and aggregates the Symbol's data, without a
+        Session, see Symbol.cache().
+
+        Parameters
+        ----------
+        since : obj, optional
+            The index value an incremental cache starts from.
+        existing : DataFrame, optional
+            The datatable's existing data, required with since.  Rows
+            before since are kept, and the rest replaced.  Only the kept
+            rows with a changed Override or FailSafe are aggregated again.
+        fetchcache : FetchCache, optional
+        stage : FetchStage, optional
+            By default, a Symbol with more than one Feed uses its own.
+        driver : str, optional
+            The name of the DBAPI module, used by DBAPI Feeds.
+        smrp : SymbolReport, optional
+            Added to, rather than starting a new report.
+
+        Returns
+        -------
+        tuple of the DataFrame to store in the datatable, and the
+        SymbolReport.
+        """
+        data = []
+        smrp = smrp or SymbolReport(self.name)
+
+        if len(self.feeds) == 0:
+            err_msg = "Symbol has no Feeds. Can't cache a feed-less Symbol."
+            raise Exception(err_msg)
+
+        try:
+            datt = datadefs[self.datadef]
+
+            rp = ReportPoint('datadef', 'class', datt)
+            smrp.add_reportpoint(rp)
+
+            pending = {}
+            ownstage = stage is None and len(self.feeds) > 1
+            if ownstage:
+                workers = read_config(sect='fetching', sett='workers',
+                                      default='4')
+                stage = FetchStage(workers=min(int(workers), len(self.feeds)))
+            try:
+                if stage is not None:
+                    for fplan in self.feeds:
+                        pending[fplan.fnum] = fplan.request(stage, since,
+                                                            fetchcache, driver)
+            finally:
+                if ownstage:
+                    stage.close()
+
+            hits = 0
+            for fplan in self.feeds:
+                fdrp, fdata = fplan.cache(since, fetchcache, driver,
+                                          pending.get(fplan.fnum))
+                smrp.add_feedreport(fdrp)
+                hits += any(rp.attribute == 'fetchcache'
+                            for rp in fdrp.reportpoints)
+                data.append(datt(fdata).converted)
+
+            rp = ReportPoint('fetchcache', 'hits', hits)
+            smrp.add_reportpoint(rp)
+        except:
+            point = "caching"
+            smrp = self.handle_exception(point, smrp)
+
+        try:
+            data = pd.concat(data, axis=1)
+        except:
+            point = "concatenation"
+            smrp = self.handle_exception(point, smrp)
+
+        indt = indexingtypes[self.indimp]
+        indt = indt(data, self.case, dict(self.index_kwargs))
+        data = indt.final_dataframe()
+
+        if since is not None:
+            # stitch the freshly fetched tail, onto the untouched
+            # part of the existing datatable.
+            feed_cols = [fplan.colname for fplan in self.feeds]
+            data = data[data.index >= since]
+            kept = existing[existing.index < since][feed_cols]
+            data = pd.concat([kept, data[feed_cols]])
+
+        data = apply_orfs(data, 'override_feed000', self.overrides)
+        data = apply_orfs(data, 'failsafe_feed999', self.failsafes)
+
+        try:
+            data = data.fillna(value=pd.np.nan)
+            data = data[sorted_feed_cols(data)]
+            if since is None:
+                data['final'] = FeedAggregator(self.agg_method).aggregate(data)
+            else:
+                data['final'] = self._aggregate_stale(data, since, existing)
+        except:
+            point = "aggregation"
+            smrp = self.handle_exception(point, smrp)
+
+        return data, smrp
+
+    def _aggregate_stale(self, data, since, existing):
+        """
+        Aggregates only the rows of an incremental cache whose inputs may
+        have changed, the fetched tail, new rows, and rows where an
+        Override or FailSafe differs from the stored one.  Every other
+        row keeps its stored final value.
+
+        Aggregators that aren't row-wise, pick a feed from every row, so
+        the whole frame is aggregated instead.
+        """
+        aggregator = FeedAggregator(self.agg_method)
+        if not aggregator.rowwise:
+            return aggregator.aggregate(data)
+
+        stale = pd.Series(data.index >= since, index=data.index)
+        stale = stale | ~data.index.isin(existing.index)
+
+        old = existing.reindex(data.index)
+        for col in ('override_feed000', 'failsafe_feed999'):
+            new, was = data[col], old[col]
+            same = (new == was) | (new.isnull() & was.isnull())
+            stale = stale | ~same
+
+        final = old['final'].copy()
+        if stale.any():
+            agg = aggregator.aggregate(data[stale])
+            final[stale] = agg
+        return final
+
+    def source_requests(self, since=None):
+        """
+        Parameters
+        ----------
+        since : obj, optional
+            The index value an incremental cache starts from.
+
+        Returns
+        -------
+        list of (stype, kwargs) tuples, for each Feed, see
+        FetchCache.prefetch()
+        """
+        return [fplan.source_kwargs(since, FeedReport(fplan.fnum))
+                for fplan in self.feeds]
+
+    def handle_exception(self, point, reporter):
+        msg = "Exception at the point of {} for {}"
+        msg = msg.format(point, self.name)
+        return _handle_exception(self.handle, point, msg, reporter)
+
+
+def _flags(handle, points):
+    return tuple((point, getattr(handle, point).val) for point in points)
+
+def _batches(names, batchsize):
+    for i in range(0, len(names), batchsize):
+        yield names[i:i + batchsize]
+
+def load_plans(ses, names, batchsize=500):
+    """
+    Loads the plans of many Symbols, with nine queries per batch of
+    names, however many Feeds, kwargs and Overrides they have.
+
+    Parameters
+    ----------
+    ses : Session
+    names : list of str
+        Symbol names.  Names without a Symbol are left out.
+    batchsize : int, optional
+        Names per query, so a long list doesn't run into a database's
+        limit on bound parameters.
+
+    Returns
+    -------
+    dict of SymbolPlan, keyed by Symbol name.
+    """
+    from sqlalchemy.orm import joinedload
+    from trump.orm import Symbol, IndexKwarg, Feed, FeedSource, \
+        FeedSourceKwarg, FeedMunge, FeedMungeKwarg, SymbolHandle, \
+        FeedHandle, Override, FailSafe, munging_pipeline, latest_orfs
+
+    symhpoints = [c.name for c in SymbolHandle.__table__.columns
+                  if c.name != 'symname']
+    fdhpoints = [c.name for c in FeedHandle.__table__.columns
+                 if c.name not in ('symname', 'fnum')]
+
+    plans = {}
+    for batch in _batches(list(names), batchsize):
+
+        def rows(cls):
+            return ses.query(cls).filter(cls.symname.in_(batch))
+
+        indkwargs = {}
+        for ikw in rows(IndexKwarg):
+            indkwargs.setdefault(ikw.symname, []).append((ikw.kword, ikw.val))
+
+        sources = {(src.symname, src.fnum): src for src in rows(FeedSource)}
+
+        srckwargs = {}
+        for skw in rows(FeedSourceKwarg):
+            key = (skw.symname, skw.fnum)
+            srckwargs.setdefault(key, {})[skw.kword] = skw.val
+
+        munges = {}
+        for mgn in rows(FeedMunge).order_by(FeedMunge.order):
+            munges.setdefault((mgn.symname, mgn.fnum), []).append(mgn)
+
+        mungekwargs = {}
+        for mkw in rows(FeedMungeKwarg):
+            key = (mkw.symname, mkw.fnum, mkw.order)
+            mungekwargs.setdefault(key, {})[mkw.kword] = mkw.val
+
+        overrides = latest_orfs(ses, Override, batch)
+        failsafes = latest_orfs(ses, FailSafe, batch)
+
+        feeds = {}
+        qry = rows(Feed).options(joinedload(Feed.handle))
+        for afeed in qry.order_by(Feed.fnum):
+            key = (afeed.symname, afeed.fnum)
+
+            src = sources[key]
+            kwargs = srckwargs.get(key, {})
+            # sourcing_key settings override database defined kwargs
+            if src.sourcing_key:
+                kwargs.update(read_settings()[src.stype][src.sourcing_key])
+
+            steps = [(mgn.mtype, mgn.method,
+                      mungekwargs.get(key + (mgn.order,), {}))
+                     for mgn in munges.get(key, [])]
+
+            fplan = FeedPlan(afeed.symname, afeed.fnum, src.stype,
+                             tuple(sorted(kwargs.items())),
+                             munging_pipeline(ses, key, steps),
+                             _flags(afeed.handle, fdhpoints))
+            feeds.setdefault(afeed.symname, []).append(fplan)
+
+        qry = ses.query(Symbol).filter(Symbol.name.in_(batch))
+        qry = qry.options(joinedload(Symbol.index), joinedload(Symbol.dtype),
+                          joinedload(Symbol.handle))
+        for sym in qry:
+            plans[sym.name] = SymbolPlan(sym.name, sym.agg_method,
+                                         sym.dtype.datadef, sym.index.indimp,
+                                         sym.index.case,
+                                         tuple(sorted(indkwargs.get(sym.name,
+                                                                    []))),
+                                         _flags(sym.handle, symhpoints),
+                                         tuple(feeds.get(sym.name, [])),
+                                         tuple(overrides.get(sym.name, [])),
+                                         tuple(failsafes.get(sym.name, [])))
+    return plans
+
+def load_plan(ses, name):
+    """ Loads the plan of a single Symbol, see load_plans() """
+    return load_plans(ses, [name])[name]
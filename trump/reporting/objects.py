@@ -95,8 +95,11 @@ class TrumpReport(object):
     def __init__(self, name):
         self.name = name
         self.sreports = []
+        self.reportpoints = []
     def add_symbolreport(self, sreport):
         self.sreports.append(sreport)
+    def add_reportpoint(self, rpoint):
+        self.reportpoints.append(rpoint)
     
     @property
     def html(self):
@@ -105,6 +108,10 @@ class TrumpReport(object):
         
         thtml.append("<h1>{}</h1>".format(self.name))
         
+        for rp in self.reportpoints:
+            thtml.append(rp.html)
+            thtml.append("<br>")
+
         for sr in self.sreports:
             thtml.append(sr.html)
             thtml.append("<br>")
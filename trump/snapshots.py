@@ -0,0 +1,164 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+
+"""
+The snapshot store keeps the raw, pre-munge, data of each Feed on local
+disk, so a recache within a source type's time-to-live doesn't go back to
+the network.  Snapshots are written as HDF5, if PyTables is installed, or
+pickled otherwise, and the least recently used are evicted once the store
+grows past its size limit.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from trump.options import read_config
+
+try:
+    import tables
+    HDF5 = True
+except ImportError:
+    HDF5 = False
+
+
+class SnapshotStore(object):
+
+    """
+    A directory of Series snapshots, keyed by source type and sourcing
+    kwargs.  Only source types with a time-to-live are stored.
+    """
+
+    def __init__(self, directory, ttls, max_size_mb=None):
+        """
+        Parameters
+        ----------
+        directory : str
+            Created if it doesn't exist.
+        ttls : dict
+            Seconds a snapshot stays fresh, keyed by source type, with the
+            key 'default' used for any other type.  Types without a
+            positive time-to-live aren't snapshotted.
+        max_size_mb : float, optional
+            Once the store's files total more than this, the least
+            recently used are deleted.  Defaults to no limit.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self.directory = directory
+        self.ttls = {stype.lower(): float(ttl) for stype, ttl in ttls.iteritems()}
+        self.max_size = None
+        if max_size_mb is not None:
+            self.max_size = float(max_size_mb) * 1024 * 1024
+        self.ext = '.h5' if HDF5 else '.pkl'
+
+    @classmethod
+    def from_config(cls):
+        """
+        Returns
+        -------
+        SnapshotStore, from the [snapshots] and [snapshot_ttls] sections
+        of trump.cfg, or None if no directory is set.
+        """
+        directory = read_config(sect='snapshots', sett='directory', default='')
+        if directory.strip().lower() in ('', 'none'):
+            return None
+
+        ttls = read_config(sect='snapshot_ttls', default={})
+        ttls.setdefault('default', read_config(sect='snapshots', sett='ttl',
+                                               default='0'))
+        max_size_mb = read_config(sect='snapshots', sett='max_size_mb',
+                                  default='none')
+        if max_size_mb.lower() == 'none':
+            max_size_mb = None
+        return cls(directory, ttls, max_size_mb)
+
+    def ttl(self, stype):
+        return self.ttls.get(stype.lower(), self.ttls.get('default', 0))
+
+    def path(self, stype, kwargs):
+        key = repr((stype, sorted(kwargs.items())))
+        return os.path.join(self.directory,
+                            hashlib.sha1(key).hexdigest() + self.ext)
+
+    def get(self, stype, kwargs):
+        """
+        Returns
+        -------
+        The snapshot Series, or None if there isn't a fresh one.
+        """
+        ttl = self.ttl(stype)
+        if ttl <= 0:
+            return None
+
+        path = self.path(stype, kwargs)
+        try:
+            if time.time() - os.path.getmtime(path) > ttl:
+                return None
+            if HDF5:
+                data = pd.read_hdf(path, 'data')
+            else:
+                data = pd.read_pickle(path)
+        except (IOError, OSError, EOFError, KeyError):
+            return None
+
+        # atime marks use, for eviction, and mtime freshness.
+        try:
+            os.utime(path, (time.time(), os.path.getmtime(path)))
+        except OSError:
+            pass
+        return data
+
+    def put(self, stype, kwargs, data):
+        """ Stores a snapshot, if the source type has a time-to-live """
+        if self.ttl(stype) <= 0:
+            return
+
+        path = self.path(stype, kwargs)
+
+        # written aside and renamed, so readers never see a partial file.
+        fd, tmp = tempfile.mkstemp(suffix=self.ext, dir=self.directory)
+        os.close(fd)
+        try:
+            if HDF5:
+                data.to_hdf(tmp, 'data', mode='w')
+            else:
+                data.to_pickle(tmp)
+            os.rename(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+        if self.max_size is not None:
+            self.evict()
+
+    def evict(self):
+        """ Deletes the least recently used snapshots, down to max size """
+        files = []
+        for fname in os.listdir(self.directory):
+            path = os.path.join(self.directory, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((max(stat.st_atime, stat.st_mtime), stat.st_size,
+                          path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
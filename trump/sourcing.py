@@ -0,0 +1,867 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+
+"""
+Sourcing fetches the raw data behind a Feed, from the Feed's source type
+(stype) and keyword arguments, and limits how many fetches of a given
+source type can run at once.  A FetchStage runs many fetches concurrently,
+each with a timeout, so a Symbol's Feeds don't wait on each other.
+DBAPI connections are pooled, per process, and reused across fetches.
+A FetchCache holds series fetched ahead of time, eg. by one query
+covering many KEYCOL Feeds, or one parse of a CSV file covering many
+PyDataCSV Feeds, so those Feeds don't each fetch their own, and can keep
+fresh fetches in a SnapshotStore on disk, for reuse by later runs.
+"""
+
+from contextlib import contextmanager
+import datetime as dt
+import inspect
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from multiprocessing.pool import ThreadPool
+
+import pandas as pd
+
+from trump.options import read_config
+from trump.snapshots import SnapshotStore
+
+_source_limits = {}
+
+def set_source_limits(limits):
+    """
+    Sets the semaphores used to limit concurrent fetches, per source type.
+
+    Parameters
+    ----------
+    limits : dict
+        Source types (case-insensitive) mapped to a semaphore-like object,
+        from the threading or multiprocessing modules.  An empty dict
+        removes all limits.
+    """
+    _source_limits.clear()
+    for stype, sem in limits.iteritems():
+        _source_limits[stype.lower()] = sem
+
+# Set by a FetchStage's worker thread, to note when its fetch begins.
+_slot_local = threading.local()
+
+def _note_start(stype):
+    begin = getattr(_slot_local, 'begin', None)
+    if begin is not None and not begin():
+        # whoever submitted it gave up waiting, so the slot goes to the
+        # next fetch, rather than to one whose result is discarded.
+        msg = "{} fetch timed out, waiting for a source slot".format(stype)
+        raise FetchTimeout(msg)
+
+@contextmanager
+def source_slot(stype):
+    """ Waits for, and holds, a fetch slot for the source type, if limited """
+    sem = _source_limits.get(stype.lower())
+    if sem is None:
+        _note_start(stype)
+        yield
+    else:
+        with sem:
+            _note_start(stype)
+            yield
+
+def fetch(stype, kwargs, driver=None):
+    """
+    Fetches a single series from a source.
+
+    Parameters
+    ----------
+    stype : str
+        The source type, eg. Quandl, DBAPI, PyDataCSV...
+    kwargs : dict
+        The Feed's sourcing keyword arguments, after any sourcing_key
+        settings have been applied.
+    driver : str, optional
+        The name of the DBAPI module, used by the DBAPI source type.
+
+    Returns
+    -------
+    pandas.Series
+    """
+    # Depending on the feed type, use the kwargs appropriately to
+    # populate a Series.
+
+    # For development of the handler, raise an exception...
+    # raise Exception("There was a problem of somekind!")
+
+    if stype in column_selectors:
+        selector = column_selectors[stype]
+        payload = fetch_payload(stype, {k: v for k, v in kwargs.iteritems()
+                                        if k != selector})
+        data = select_column(stype, payload, kwargs)
+
+    elif stype == 'psycopg2':
+        dbargs = ['dsn', 'user', 'password', 'host', 'database', 'port']
+        import psycopg2 as db
+        con_kwargs = {k: v for k, v in kwargs.items() if k in dbargs}
+        con = db.connect(**con_kwargs)
+        raise NotImplementedError("pyscopg2")
+    elif stype == 'DBAPI':
+        dbargs = ['dsn', 'user', 'password', 'host', 'database', 'port']
+        con_kwargs = {k: v for k, v in kwargs.items() if k in dbargs}
+
+        if kwargs['dbinstype'] == 'COMMAND':
+            qry = kwargs['command']
+        elif kwargs['dbinstype'] == 'KEYCOL':
+            reqd = ['indexcol', 'datacol', 'table', 'keycol', 'key']
+            rel = (kwargs[c] for c in reqd)
+            if 'since' in kwargs:
+                qry = "SELECT {0},{1} FROM {2} WHERE {3} = '{4}' AND {0} >= '{5}' ORDER BY {0};"
+                qry = qry.format(*(list(rel) + [kwargs['since']]))
+            else:
+                qry = "SELECT {0},{1} FROM {2} WHERE {3} = '{4}' ORDER BY {0};"
+                qry = qry.format(*rel)
+        else:
+            raise NotImplementedError("The database type {} has not been created.".format(kwargs['dbinstype']))
+
+        with dbapi_pool().connection(driver, con_kwargs) as con:
+            cur = con.cursor()
+            cur.execute(qry)
+            results = [(row[0], row[1]) for row in cur.fetchall()]
+            cur.close()
+
+        ind, dat = zip(*results)
+        data = pd.Series(dat, ind)
+    elif stype == 'SQLAlchemy':
+        NotImplementedError("SQLAlchemy")
+    elif stype == 'PyDataCSV':
+        col = kwargs['data_column']
+        del kwargs['data_column']
+
+        fpob = kwargs['filepath_or_buffer']
+        del kwargs['filepath_or_buffer']
+
+        df = read_csv_columns(fpob, [col], kwargs)
+
+        data = df[col]
+
+    else:
+        raise Exception("Unknown Source Type : {}".format(stype))
+
+    return data
+
+# The kwarg picking a Series out of a source's payload, for source types
+# whose payload can be shared by Feeds differing only in that kwarg.
+column_selectors = {'Quandl' : 'fieldname',
+                    'PyDataDataReaderST' : 'data_column'}
+
+def fetch_payload(stype, kwargs):
+    """
+    Fetches the whole payload of a source with a column selector, see
+    column_selectors, from kwargs without the selector.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if stype == 'Quandl':
+        import Quandl as q
+        return q.get(**kwargs)
+
+    elif stype == 'PyDataDataReaderST':
+        import pandas.io.data as pydata
+
+        kwargs = dict(kwargs)
+        fmt = "%Y-%m-%d"
+        if 'start' in kwargs:
+            kwargs['start'] = dt.datetime.strptime(kwargs['start'], fmt)
+        if 'end' in kwargs:
+            if kwargs['end'] == 'now':
+                kwargs['end'] = dt.datetime.now()
+            else:
+                kwargs['end'] = dt.datetime.strptime(kwargs['end'], fmt)
+
+        return pydata.DataReader(**kwargs)
+
+    raise Exception("{} has no column selector".format(stype))
+
+def select_column(stype, payload, kwargs):
+    """ picks a Feed's Series out of a payload, see fetch_payload() """
+    if stype == 'Quandl':
+        try:
+            fn = kwargs['fieldname']
+        except KeyError:
+            raise KeyError("fieldname wasn't specified in Quandl Feed")
+
+        try:
+            return payload[fn]
+        except KeyError:
+            kemsg = """{} was not found in list of Quandle headers:\n
+                     {}""".format(fn, str(payload.columns))
+            raise KeyError(kemsg)
+
+    return payload[kwargs[column_selectors[stype]]]
+
+
+class DBAPIConnectionPool(object):
+
+    """
+    Keeps idle DBAPI connections open, keyed by driver and connection
+    parameters, so that Feeds sourced from the same database don't each
+    connect to it.  Connections are thread-safe to check out, but are
+    only ever used by one fetch at a time.
+    """
+
+    def __init__(self, size=None, idle_timeout=None):
+        """
+        Parameters
+        ----------
+        size : int, optional
+            The most idle connections kept, per set of connection
+            parameters.  Defaults to the [dbapi_pool] size setting in
+            trump.cfg, or 4.  Zero disables pooling.
+        idle_timeout : float, optional
+            Seconds an idle connection is kept before it's closed.
+            Defaults to the [dbapi_pool] idle_timeout setting in
+            trump.cfg, or 300.
+        """
+        if size is None:
+            size = read_config(sect='dbapi_pool', sett='size', default='4')
+        if idle_timeout is None:
+            idle_timeout = read_config(sect='dbapi_pool',
+                                       sett='idle_timeout', default='300')
+        self.size = int(size)
+        self.idle_timeout = float(idle_timeout)
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, driver, con_kwargs):
+        """
+        Checks out a connection, connecting if none are idle, and checks it
+        back in afterwards.  A connection that raised is closed instead.
+        """
+        key = (driver, tuple(sorted(con_kwargs.items())))
+
+        con = self._checkout(key)
+        if con is None:
+            db = __import__(driver)
+            con = db.connect(**con_kwargs)
+
+        try:
+            yield con
+        except:
+            _close_quietly(con)
+            raise
+        else:
+            self._checkin(key, con)
+
+    def _checkout(self, key):
+        with self.lock:
+            self._evict()
+            idle = self.idle.get(key, [])
+            if idle:
+                return idle.pop()[0]
+        return None
+
+    def _checkin(self, key, con):
+        try:
+            # don't keep a read transaction open, while idle.
+            con.rollback()
+        except Exception:
+            _close_quietly(con)
+            return
+
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append((con, time.time()))
+                con = None
+        if con is not None:
+            _close_quietly(con)
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_timeout
+        for key, idle in self.idle.items():
+            keep = []
+            for con, used in idle:
+                if used < cutoff:
+                    _close_quietly(con)
+                else:
+                    keep.append((con, used))
+            if keep:
+                self.idle[key] = keep
+            else:
+                del self.idle[key]
+
+    def clear(self):
+        """ Closes every idle connection """
+        with self.lock:
+            for idle in self.idle.values():
+                for con, _ in idle:
+                    _close_quietly(con)
+            self.idle = {}
+
+def _close_quietly(con):
+    try:
+        con.close()
+    except Exception:
+        pass
+
+def _csv_usecols(fpob, columns, kwargs):
+    """
+    Restricts read_csv's kwargs to parse only the index and data columns,
+    by peeking at the file's header, so positional index_col and
+    parse_dates values can be mapped to names.
+
+    Returns
+    -------
+    dict of kwargs, or None if the file's layout can't be safely
+    restricted, in which case every column is parsed.
+    """
+    if 'usecols' in kwargs or 'names' in kwargs:
+        return None
+    if kwargs.get('header', 'infer') not in ('infer', 0):
+        return None
+
+    peekargs = ['sep', 'delimiter', 'dialect', 'skiprows', 'encoding',
+                'comment', 'quotechar', 'skipinitialspace', 'engine']
+    peek = {k: v for k, v in kwargs.iteritems() if k in peekargs}
+    header = list(pd.read_csv(fpob, nrows=0, **peek).columns)
+    if len(set(header)) != len(header):
+        return None
+
+    def named(col):
+        if isinstance(col, bool):
+            raise ValueError(col)
+        if isinstance(col, int):
+            return header[col]
+        if col in header:
+            return col
+        raise ValueError(col)
+
+    try:
+        kwargs = dict(kwargs)
+        index_col = kwargs.get('index_col')
+        if index_col is None or index_col is False:
+            indcols = []
+        elif isinstance(index_col, (list, tuple)):
+            indcols = [named(c) for c in index_col]
+            kwargs['index_col'] = indcols
+        else:
+            indcols = [named(index_col)]
+            kwargs['index_col'] = indcols[0]
+
+        parse_dates = kwargs.get('parse_dates')
+        if isinstance(parse_dates, (list, tuple)):
+            kwargs['parse_dates'] = [named(c) for c in parse_dates]
+
+        usecols = indcols + [named(c) for c in columns]
+    except (ValueError, IndexError, TypeError):
+        return None
+
+    kwargs['usecols'] = sorted(set(usecols), key=header.index)
+    return kwargs
+
+_read_csv_args = inspect.getargspec(pd.read_csv).args
+
+def read_csv_columns(fpob, columns, kwargs):
+    """
+    Reads a CSV's index, and only the columns needed.  Local files are
+    memory-mapped, where pandas supports it, and parsed in chunks of
+    [csv] chunksize rows from trump.cfg, so wide or long files never
+    need to be held in memory whole.
+
+    Parameters
+    ----------
+    fpob : str or file-like
+        The filepath_or_buffer, passed to pandas.read_csv.
+    columns : list of str
+        The data columns needed.
+    kwargs : dict
+        Any other pandas.read_csv kwargs.
+
+    Returns
+    -------
+    DataFrame, of the requested columns.
+    """
+    kwargs = dict(kwargs)
+
+    local = isinstance(fpob, basestring) and os.path.isfile(fpob)
+    if local:
+        kwargs = _csv_usecols(fpob, columns, kwargs) or kwargs
+        if 'memory_map' in _read_csv_args and kwargs.get('engine') != 'python':
+            kwargs.setdefault('memory_map', True)
+
+    if 'chunksize' not in kwargs and 'iterator' not in kwargs:
+        kwargs['chunksize'] = int(read_config(sect='csv', sett='chunksize',
+                                              default='100000'))
+
+    reader = pd.read_csv(fpob, **kwargs)
+    if isinstance(reader, pd.DataFrame):
+        return reader[columns]
+    return pd.concat([chunk[columns] for chunk in reader])
+
+_dbapi_pool = {}
+
+def dbapi_pool():
+    """
+    Returns
+    -------
+    The process' DBAPIConnectionPool.  A forked process, eg. a bulk
+    caching worker, gets a new one rather than sharing its parent's
+    connections.
+    """
+    pid = os.getpid()
+    if pid not in _dbapi_pool:
+        _dbapi_pool.clear()
+        _dbapi_pool[pid] = DBAPIConnectionPool()
+    return _dbapi_pool[pid]
+
+
+class FetchCache(object):
+
+    """
+    Series fetched ahead of caching, keyed by source type and sourcing
+    kwargs.  The kwargs include the 'since' of an incremental cache, so
+    a Series fetched from since onward is only used by Feeds asking for
+    the same range.
+
+    It also shares payloads between Feeds, for the length of a cache run.
+    Feeds of a source type in column_selectors, with the same kwargs
+    other than the column selector, eg. one Quandl dataset with different
+    fieldnames, share one fetch.
+
+    Fresh fetches are also kept in a SnapshotStore, if one is configured,
+    and reused by later runs until their time-to-live passes.
+    """
+
+    def __init__(self, snapshots=None, force_refresh=False):
+        """
+        Parameters
+        ----------
+        snapshots : SnapshotStore, optional
+            Defaults to the store of the [snapshots] section of trump.cfg,
+            if it sets a directory.  Pass False to not use one.
+        force_refresh : bool, default False
+            Skip snapshot lookups, so every fetch goes to the source.
+            Fresh fetches still replace the stored snapshots.
+        """
+        if snapshots is None:
+            snapshots = SnapshotStore.from_config()
+        self.snapshots = snapshots or None
+        self.force_refresh = force_refresh
+        self.series = {}
+        self.payloads = {}
+        self.hits = 0
+        self._init_locks()
+
+    def _init_locks(self):
+        self._lock = threading.Lock()
+        self._keylocks = {}
+
+    def __getstate__(self):
+        # locks can't be pickled, eg. when sent to a process pool.
+        state = self.__dict__.copy()
+        del state['_lock']
+        del state['_keylocks']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_locks()
+
+    def fetch(self, stype, kwargs, driver=None):
+        """
+        Fetches a Series, see fetch(), from the cache if possible.
+
+        Returns
+        -------
+        tuple of the Series, and how it was found in the cache, either
+        'series', 'snapshot', 'payload' or None for a fresh fetch.
+        """
+        data = self.get(stype, kwargs)
+        if data is not None:
+            self._hit()
+            return data, 'series'
+
+        if self.snapshots is not None and not self.force_refresh:
+            data = self.snapshots.get(stype, kwargs)
+            if data is not None:
+                self._hit()
+                return data, 'snapshot'
+
+        # fetch() can consume kwargs, which still key the snapshot.
+        data, how = self._fetch(stype, dict(kwargs), driver)
+        if self.snapshots is not None:
+            try:
+                self.snapshots.put(stype, kwargs, data)
+            except Exception as exp:
+                msg = "Couldn't store {} snapshot: {}"
+                warnings.warn(msg.format(stype, exp))
+        return data, how
+
+    def _fetch(self, stype, kwargs, driver):
+        if stype not in column_selectors:
+            with source_slot(stype):
+                return fetch(stype, kwargs, driver), None
+
+        selector = column_selectors[stype]
+        pkwargs = {k: v for k, v in kwargs.iteritems() if k != selector}
+        key = self.key(stype, pkwargs)
+
+        with self._lock:
+            keylock = self._keylocks.setdefault(key, threading.Lock())
+
+        # a second Feed waits for the first's fetch, rather than repeating it
+        with keylock:
+            payload = self.payloads.get(key)
+            found = payload is not None
+            if not found:
+                with source_slot(stype):
+                    payload = fetch_payload(stype, pkwargs)
+                self.payloads[key] = payload
+
+        if found:
+            self._hit()
+            return select_column(stype, payload, kwargs).copy(), 'payload'
+        return select_column(stype, payload, kwargs).copy(), None
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
+
+    @staticmethod
+    def key(stype, kwargs):
+        # kwargs can hold lists, eg. parse_dates, so their repr is used.
+        return (stype, repr(sorted(kwargs.items())))
+
+    def get(self, stype, kwargs):
+        """ returns a copy of the cached Series, or None """
+        data = self.series.get(self.key(stype, kwargs))
+        if data is not None:
+            data = data.copy()
+        return data
+
+    def put(self, stype, kwargs, data):
+        self.series[self.key(stype, kwargs)] = data
+
+    def __contains__(self, stype_kwargs):
+        return self.key(*stype_kwargs) in self.series
+
+    def __len__(self):
+        return len(self.series)
+
+    def prefetch(self, requests, driver):
+        """
+        Fetches, ahead of time, everything that can be fetched for many
+        Feeds at once, see prefetch_keycol() and prefetch_csv().  If
+        either fails, the Feeds are left to fetch their own data.
+
+        Parameters
+        ----------
+        requests : list of (stype, kwargs) tuples
+        driver : str
+            The name of the DBAPI module.
+        """
+        try:
+            self.prefetch_keycol(requests, driver)
+        except Exception as exp:
+            msg = "Batched KEYCOL fetch failed, fetching Feeds one by one: {}"
+            warnings.warn(msg.format(exp))
+
+        try:
+            self.prefetch_csv(requests)
+        except Exception as exp:
+            msg = "Shared CSV parse failed, fetching Feeds one by one: {}"
+            warnings.warn(msg.format(exp))
+
+    def prefetch_csv(self, requests):
+        """
+        Parses each local CSV file once, for all the PyDataCSV Feeds that
+        read it with the same kwargs, rather than once per Feed.
+
+        Parameters
+        ----------
+        requests : list of (stype, kwargs) tuples
+            Sourcing details, see fetch().  Anything other than a
+            PyDataCSV source, of a local file, is ignored.
+
+        Returns
+        -------
+        int, the number of Series fetched.
+        """
+        groups = {}
+        for stype, kwargs in requests:
+            if stype != 'PyDataCSV':
+                continue
+            fpob = kwargs['filepath_or_buffer']
+            if not (isinstance(fpob, basestring) and os.path.isfile(fpob)):
+                continue
+            csvkw = {k: v for k, v in kwargs.iteritems()
+                     if k not in ('data_column', 'since')}
+            grp = repr(sorted(csvkw.items()))
+            groups.setdefault(grp, (csvkw, []))[1].append(kwargs)
+
+        fetched = 0
+        for csvkw, grp in groups.itervalues():
+            if len(grp) < 2:
+                continue
+            csvkw = dict(csvkw)
+            fpob = csvkw.pop('filepath_or_buffer')
+            columns = sorted(set(kwargs['data_column'] for kwargs in grp))
+            df = read_csv_columns(fpob, columns, csvkw)
+            for kwargs in grp:
+                self.put('PyDataCSV', kwargs, df[kwargs['data_column']])
+                fetched += 1
+        return fetched
+
+    def prefetch_keycol(self, requests, driver, batchsize=500):
+        """
+        Fetches many DBAPI KEYCOL Feeds, with one query per group of
+        Feeds that share a connection, table, index, data and key
+        column, and since, rather than a query per Feed.
+
+        Parameters
+        ----------
+        requests : list of (stype, kwargs) tuples
+            Sourcing details, see fetch().  Anything other than a DBAPI
+            KEYCOL source is ignored.
+        driver : str
+            The name of the DBAPI module.
+        batchsize : int, optional
+            The most keys in a single query's IN clause.
+
+        Returns
+        -------
+        int, the number of Series fetched.
+        """
+        dbargs = ['dsn', 'user', 'password', 'host', 'database', 'port']
+        cols = ['table', 'indexcol', 'datacol', 'keycol']
+
+        groups = {}
+        for stype, kwargs in requests:
+            if stype != 'DBAPI' or kwargs.get('dbinstype') != 'KEYCOL':
+                continue
+            con_kwargs = {k: v for k, v in kwargs.items() if k in dbargs}
+            grp = (tuple(sorted(con_kwargs.items())),
+                   tuple(kwargs[c] for c in cols), kwargs.get('since'))
+            groups.setdefault(grp, []).append(kwargs)
+
+        fetched = 0
+        for (con_kwargs, (table, indexcol, datacol, keycol), since), grp in \
+                groups.iteritems():
+
+            bykey = {}
+            for kwargs in grp:
+                bykey.setdefault(kwargs['key'], []).append(kwargs)
+            keys = sorted(bykey)
+
+            for i in range(0, len(keys), batchsize):
+                batch = keys[i:i + batchsize]
+                inlist = ", ".join("'{}'".format(str(k).replace("'", "''"))
+                                   for k in batch)
+
+                where = "{} IN ({})".format(keycol, inlist)
+                if since is not None:
+                    where += " AND {} >= '{}'".format(indexcol, since)
+
+                qry = "SELECT {0},{1},{2} FROM {3} WHERE {4} ORDER BY {0},{1};"
+                qry = qry.format(keycol, indexcol, datacol, table, where)
+
+                pool = dbapi_pool()
+                with pool.connection(driver, dict(con_kwargs)) as con:
+                    cur = con.cursor()
+                    cur.execute(qry)
+                    results = cur.fetchall()
+                    cur.close()
+
+                rows = {}
+                for row in results:
+                    rows.setdefault(row[0], []).append((row[1], row[2]))
+
+                # keys without any rows are left to fail, when fetched alone.
+                for key, keyrows in rows.iteritems():
+                    ind, dat = zip(*keyrows)
+                    for kwargs in bykey.get(key, []):
+                        self.put('DBAPI', kwargs, pd.Series(dat, ind))
+                        fetched += 1
+        return fetched
+
+
+class FetchTimeout(Exception):
+    pass
+
+
+class FetchStage(object):
+
+    """
+    Runs source fetches concurrently, in a pool of threads, and hands back
+    each result, or the exception it raised, once it's asked for.
+
+    Python 2 has no asyncio, and the source libraries all block, so
+    threads are used to overlap their network and database round-trips.
+    A fetch which times out can't be interrupted, so it's left to finish
+    in the background, and its result is discarded.
+    """
+
+    def __init__(self, workers=None, timeouts=None, queue_timeout=None):
+        """
+        Parameters
+        ----------
+        workers : int, optional
+            The number of fetches to run at once.  Defaults to the
+            [fetching] workers setting in trump.cfg, or 4.
+        timeouts : dict, optional
+            Seconds to wait for a fetch, once it begins, keyed by source
+            type, with the key 'default' used for any other type.
+            Defaults to the [fetch_timeouts] section of trump.cfg, and the
+            [fetching] timeout setting, or no timeout at all.
+        queue_timeout : float, optional
+            Seconds a fetch with a timeout waits, from when it's
+            submitted, for a worker and a source slot.  Defaults to the
+            [fetching] queue_timeout setting, or the fetch's own timeout.
+        """
+        if workers is None:
+            workers = read_config(sect='fetching', sett='workers',
+                                  default='4')
+        if queue_timeout is None:
+            queue_timeout = read_config(sect='fetching',
+                                        sett='queue_timeout',
+                                        default='none')
+        self.queue_timeout = None
+        if str(queue_timeout).lower() != 'none':
+            self.queue_timeout = float(queue_timeout)
+        if timeouts is None:
+            timeouts = read_config(sect='fetch_timeouts', default={})
+            timeouts = dict(timeouts)
+            timeouts.setdefault('default', read_config(sect='fetching',
+                                                       sett='timeout',
+                                                       default='none'))
+
+        self.timeouts = {}
+        for stype, secs in timeouts.iteritems():
+            if str(secs).lower() != 'none':
+                self.timeouts[stype.lower()] = float(secs)
+
+        self.pool = ThreadPool(int(workers))
+
+    def timeout(self, stype):
+        return self.timeouts.get(stype.lower(), self.timeouts.get('default'))
+
+    def submit(self, stype, kwargs, driver=None, fetchcache=None):
+        """
+        Starts fetching a series, see fetch(), or FetchCache.fetch() if a
+        fetchcache is given.
+
+        Returns
+        -------
+        PendingFetch
+        """
+        timeout = self.timeout(stype)
+        queue_timeout = self.queue_timeout
+        if queue_timeout is None:
+            queue_timeout = timeout
+
+        pending = PendingFetch(stype, timeout, queue_timeout)
+        args = (stype, kwargs, driver, fetchcache, pending.begin)
+        pending.asyncres = self.pool.apply_async(_fetch_in_slot, args)
+        return pending
+
+    def close(self):
+        """ Stops accepting fetches, without waiting on any timed out ones """
+        self.pool.close()
+
+
+class PendingFetch(object):
+
+    """
+    A fetch submitted to a FetchStage.  Its timeout runs from when the
+    fetch begins, so time spent queued for a worker, or for a source
+    slot, doesn't count against it.  The time spent queued is bounded
+    separately, by the queue_timeout, so a source that never returns
+    can't hold up the fetches queued behind it forever.
+    """
+
+    def __init__(self, stype, timeout=None, queue_timeout=None):
+        self.stype = stype
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.asyncres = None
+        self.cached = None
+        self.submitted = time.time()
+        self.started = None
+        self.cancelled = False
+        self._begun = threading.Event()
+        self._lock = threading.Lock()
+
+    def begin(self):
+        """
+        Notes the fetch has begun, called from the worker thread.
+
+        Returns
+        -------
+        bool, False if the fetch was given up on while it was queued.
+        """
+        with self._lock:
+            if self.cancelled:
+                return False
+            if not self._begun.is_set():
+                self.started = time.time()
+                self._begun.set()
+            return True
+
+    def _cancel(self):
+        """ gives up on a queued fetch, returning False if it has begun """
+        with self._lock:
+            if not self._begun.is_set():
+                self.cancelled = True
+            return self.cancelled
+
+    def result(self):
+        """
+        Waits for the fetch, until its timeout has passed since it began,
+        or its queue_timeout since it was submitted, if it hasn't begun.
+
+        Returns
+        -------
+        pandas.Series.  If it was fetched via a FetchCache, how it was
+        found in the cache is then set as .cached
+
+        Raises
+        ------
+        FetchTimeout
+            If either timeout passes first.
+        Exception
+            Whatever the fetch itself raised.
+        """
+        # waits without a timeout can't be interrupted, in Python 2.
+        if self.timeout is None:
+            timeout = 1e9
+        else:
+            queued = self.submitted + self.queue_timeout - time.time()
+            if not self._begun.wait(max(queued, 0)) and self._cancel():
+                msg = "{} fetch timed out, waiting for a source slot"
+                raise FetchTimeout(msg.format(self.stype))
+            timeout = max(self.started + self.timeout - time.time(), 0)
+
+        try:
+            data, self.cached = self.asyncres.get(timeout)
+        except multiprocessing.TimeoutError:
+            msg = "{} fetch timed out".format(self.stype)
+            raise FetchTimeout(msg)
+        return data
+
+def _fetch_in_slot(stype, kwargs, driver, fetchcache, begin):
+    _slot_local.begin = begin
+    try:
+        if fetchcache is not None:
+            return fetchcache.fetch(stype, kwargs, driver)
+        with source_slot(stype):
+            return fetch(stype, kwargs, driver), None
+    finally:
+        _slot_local.begin = None
+        # eg. a cache hit, which never takes a slot.
+        begin()
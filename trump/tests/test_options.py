@@ -0,0 +1,58 @@
+from .. import options
+from ..options import _read_options
+
+import os
+import warnings
+
+class TestOptions(object):
+
+    def setup_method(self, test_method):
+        self.parses = 0
+        self.parse = options._parse_options
+
+    def write(self, path, value, mtime):
+        with open(path, 'w') as fout:
+            fout.write("[sect]\nsett: {}\n".format(value))
+        os.utime(path, (mtime, mtime))
+
+    def counted_parse(self, config_dir):
+        self.parses += 1
+        return self.parse(config_dir)
+
+    def test_memoized(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(options, '_parse_options', self.counted_parse)
+
+        cfg = str(tmpdir.join('tst.cfg'))
+        self.write(cfg, 'one', 1000000000)
+
+        reader = _read_options([str(tmpdir)], 'tst')
+
+        assert reader(sect='sect', sett='sett') == 'one'
+        assert reader(sect='sect') == {'sett' : 'one'}
+        assert reader(sect='nope', default='dflt') == 'dflt'
+        assert self.parses == 1
+
+        reader(sect='sect')['sett'] = 'changed'
+        assert reader(sect='sect', sett='sett') == 'one'
+
+        self.write(cfg, 'two', 1000000100)
+        assert reader(sect='sect', sett='sett') == 'two'
+        assert self.parses == 2
+
+        reader.reload()
+        assert self.parses == 3
+
+    def test_sample_warns_once(self, tmpdir):
+        cfg = str(tmpdir.join('tst.cfg_sample'))
+        self.write(cfg, 'smpl', 1000000000)
+
+        reader = _read_options([str(tmpdir)], 'tst')
+
+        with warnings.catch_warnings(record=True) as warned:
+            warnings.simplefilter('always')
+            assert reader(sect='sect', sett='sett') == 'smpl'
+            assert reader(sect='sect', sett='sett') == 'smpl'
+        assert len(warned) == 1
+
+        self.write(str(tmpdir.join('tst.cfg')), 'real', 1000000000)
+        assert reader(sect='sect', sett='sett') == 'real'
@@ -1,4 +1,9 @@
-from ..orm import SetupTrump, SymbolManager, ConversionManager
+from ..orm import SetupTrump, SymbolManager, ConversionManager, SymbolDirty, \
+    Override, FailSafe
+from ..tools import BitFlag
+from ..sourcing import FetchCache
+from ..plans import load_plan
+from ..reporting.objects import FeedReport
 
 from ..templating.templates import GoogleFinanceFT, YahooFinanceFT,\
     SimpleExampleMT, CSVFT, FFillIT, FeedsMatchVT, DateExistsVT, PctChangeMT
@@ -244,6 +249,40 @@ class TestORM(object):
         assert df.iloc[2][0] == 4
         assert df.iloc[1][0] == -2    
 
+    @pytest.mark.parametrize('window', [True, False])
+    def test_latest_orfs(self, window, monkeypatch):
+
+        from .. import orm
+        monkeypatch.setattr(orm, '_has_window_functions', lambda d: window)
+
+        sm = self.sm
+
+        sym = sm.create("ltorfs", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+
+        for val in [100, 200, 300]:
+            sm.add_override(sym, dt.date(2010, 1, 3), val)
+        sm.add_override(sym, dt.date(2010, 1, 4), 400)
+        sm.add_override(sym, dt.date(2011, 1, 1), 500)
+        sm.add_fail_safe(sym, dt.date(2009, 12, 31), -1)
+
+        # stored differently, but the same index value, so the later wins.
+        sm.add_override(sym, dt.datetime(2010, 1, 6), 600)
+        sm.add_override(sym, dt.date(2010, 1, 6), 700)
+
+        sym.cache()
+        df = sym.df
+
+        assert len(df) == 56
+        assert df.ix['2010-01-03'][0] == 300
+        assert df.ix['2010-01-04'][0] == 400
+        assert df.ix['2011-01-01'][0] == 500
+        assert df.ix['2009-12-31'][0] == -1
+        assert df.ix['2010-01-05'][0] == 5
+        assert df.ix['2010-01-06'][0] == 700
+
     def test_int_index_string_data_override_failsafe(self):
         
         sm = self.sm
@@ -276,6 +315,35 @@ class TestORM(object):
         assert df.intstrdtflor[2014] == 'e'
         assert df.intstrdtflor[2015] == 'z'
 
+    def test_string_data_reaggregate(self):
+
+        sm = self.sm
+
+        sym = sm.create("strreagg", overwrite=True)
+        for fname in ['teststrdata.csv', 'teststrdata2.csv']:
+            testdata = os.path.join(curdir,'testdata',fname)
+            sym.add_feed(CSVFT(testdata, 'Amount', index_col=0))
+        sym.index.indimp = "IntIndexImp"
+        sym.dtype.datadef = "StrDataDef"
+        sm.complete()
+
+        sym.cache()
+        before = sym.df
+        existing = sym._datatable_frame()
+        assert existing['override_feed000'].isnull().all()
+
+        assert sym.reaggregate() == 0
+        rep = sym.cache(incremental=True)
+        written = [rp.value for rp in rep.reportpoints
+                   if rp.attribute == 'rows written']
+        assert written == [0]
+        assert sym.df.equals(before)
+
+        sm.add_override(sym, 2011, 'z')
+        assert sym.reaggregate() == 1
+        assert sym.df.strreagg[2011] == 'z'
+        assert sym.df.strreagg[2015] == before.strreagg[2015]
+
     def test_add_feed_post_cache(self):
         
         sm = self.sm
@@ -373,6 +441,383 @@ class TestORM(object):
         
         assert sym.df.index.freq == 'W' 
 
+    def test_incremental_cache(self, tmpdir):
+
+        sm = self.sm
+
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        with open(testdata) as fin:
+            lines = fin.read().splitlines()
+
+        tmpcsv = str(tmpdir.join('incdata.csv'))
+        with open(tmpcsv, 'w') as fout:
+            fout.write("\n".join(lines) + "\n")
+
+        sym = sm.create("incr", overwrite=True)
+        fdtemp = CSVFT(tmpcsv, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        sym.cache()
+
+        # revise the last point, and append two new ones.
+        lines[-1] = "2010/02/23,540"
+        lines += ["2010/02/24,55", "2010/02/25,56"]
+        with open(tmpcsv, 'w') as fout:
+            fout.write("\n".join(lines) + "\n")
+
+        rep = sym.cache(incremental=True)
+        written = [rp.value for rp in rep.reportpoints
+                   if rp.attribute == 'rows written']
+        assert written == [3]
+
+        sm.add_override(sym, dt.date(2010, 1, 5), 500)
+
+        sym.cache(incremental=True)
+
+        full = sm.create("incrfull", overwrite=True)
+        fdtemp = CSVFT(tmpcsv, 'Amount', parse_dates=0, index_col=0)
+        full.add_feed(fdtemp)
+        sm.add_override(full, dt.date(2010, 1, 5), 500)
+        full.cache()
+
+        df = sym.df
+        assert len(df) == 56
+        assert df.ix['2010-02-23'][0] == 540
+        assert df.ix['2010-02-25'][0] == 56
+        assert df.ix['2010-01-05'][0] == 500
+        assert (df.values == full.df.values).all()
+
+    def test_refresh_dirty(self):
+
+        sm = self.sm
+
+        sym = sm.create("dirty", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        sym.add_feed(fdtemp)
+        sym.cache()
+        assert sym.refresh_dirty() == 0
+
+        before = sym.df
+        sm.add_override(sym, dt.date(2010, 1, 5), 500)
+        sm.add_fail_safe(sym, dt.date(2010, 1, 6), 600)
+        sm.add_override(sym, dt.date(2012, 1, 2), 700)
+        assert sm.ses.query(SymbolDirty).count() == 3
+
+        assert sym.refresh_dirty() == 3
+        assert sm.ses.query(SymbolDirty).count() == 0
+
+        df = sym.df
+        assert df.ix['2010-01-05'][0] == 500
+        assert df.ix['2012-01-02'][0] == 700
+        assert len(df) == len(before) + 1
+
+        changed = (df.ix[before.index] != before).any(axis=1)
+        assert list(changed[changed].index) == [dt.datetime(2010, 1, 5)]
+
+        sm.add_override(sym, dt.date(2010, 1, 7), 800)
+        sym.cache(incremental=True)
+        assert sm.ses.query(SymbolDirty).count() == 0
+        assert sym.df.ix['2010-01-07'][0] == 800
+
+        full = sym.df
+        sym.cache()
+        assert (sym.df.values == full.values).all()
+
+    def test_reaggregate(self):
+
+        sm = self.sm
+
+        sym = sm.create("reagg", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        sym.add_feed(fdtemp, munging=SimpleExampleMT(1, 5))
+        assert sym.reaggregate() is None
+        sym.cache()
+        assert sym.reaggregate() == 0
+
+        sm.add_override(sym, dt.date(2010, 1, 5), 500)
+        sm.add_fail_safe(sym, dt.date(2012, 1, 2), 700)
+        assert sym.reaggregate() == 2
+        assert sm.ses.query(SymbolDirty).count() == 0
+        assert sym.df.ix['2010-01-05'][0] == 500
+        assert sym.df.ix['2012-01-02'][0] == 700
+
+        sym.agg_method = 'mean_fill'
+        sm.ses.commit()
+        assert sym.reaggregate() > 0
+        reagg = sym.df
+
+        sym.cache()
+        assert (sym.df.values == reagg.values).all()
+        assert sym.reaggregate() == 0
+
+    def test_partial_aggregation_column_kind(self, tmpdir):
+
+        sm = self.sm
+
+        def write(path, days, offset):
+            lines = ["Year,Amount"]
+            lines += ["2015/01/{0:02d},{1}".format(d, d + offset) for d in days]
+            with open(path, 'w') as fout:
+                fout.write("\n".join(lines) + "\n")
+
+        sparse = str(tmpdir.join('sparse.csv'))
+        full = str(tmpdir.join('full.csv'))
+        write(sparse, [5, 14, 15], 0)
+        write(full, range(1, 16), 100)
+
+        sym = sm.create("colkind", agg_method='most_populated',
+                        overwrite=True)
+        for path in [sparse, full]:
+            fdtemp = CSVFT(path, 'Amount', parse_dates=0, index_col=0)
+            sym.add_feed(fdtemp)
+        sym.cache()
+        assert sym.df.ix['2015-01-15'][0] == 115
+
+        sm.add_fail_safe(sym, dt.date(2015, 1, 15), -1)
+        sym.refresh_dirty()
+        refreshed = sym.df
+        sym.cache()
+        assert (refreshed.values == sym.df.values).all()
+
+        write(sparse, [5, 14, 15, 16], 0)
+        write(full, range(1, 17), 100)
+        sym.cache(incremental=True)
+        incremental = sym.df
+        assert incremental.ix['2015-01-16'][0] == 116
+        sym.cache()
+        assert (incremental.values == sym.df.values).all()
+
+    def test_bulk_add_orfs(self):
+
+        sm = self.sm
+
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        for name in ['bko1', 'bko2']:
+            sym = sm.create(name, overwrite=True)
+            fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+            sym.add_feed(fdtemp)
+            sym.cache()
+
+        sm.add_override('bko1', dt.date(2010, 1, 4), 100)
+
+        overrides = pd.DataFrame({'symbol' : ['bko1', 'bko1', 'bko2'],
+                                  'ind' : pd.to_datetime(['2010-01-04',
+                                                          '2010-01-05',
+                                                          '2010-01-05']),
+                                  'val' : [400, 500, 600],
+                                  'user' : ['tester', None, 'tester']})
+        added = sm.bulk_add_overrides(overrides, reaggregate=True)
+        assert added == {'bko1' : 2, 'bko2' : 1}
+
+        fail_safes = pd.DataFrame({'symbol' : ['bko2'],
+                                   'ind' : [dt.date(2012, 1, 2)],
+                                   'val' : [700.0],
+                                   'comment' : ['testcomment']})
+        sm.bulk_add_fail_safes(fail_safes)
+
+        ors = sm.ses.query(Override).filter_by(symname='bko1')
+        assert sorted(o.ornum for o in ors) == [0, 1, 2]
+        assert sm.ses.query(SymbolDirty).count() == 1
+
+        df = sm.get('bko1').df
+        assert df.ix['2010-01-04'][0] == 400
+        assert df.ix['2010-01-05'][0] == 500
+
+        bko2 = sm.get('bko2')
+        assert bko2.df.ix['2010-01-05'][0] == 600
+        assert bko2.refresh_dirty() == 1
+        assert bko2.df.ix['2012-01-02'][0] == 700
+
+        fs = sm.ses.query(FailSafe).one()
+        assert fs.fsnum == 0
+        assert fs.comment == 'testcomment'
+        assert fs.user is None
+
+    def test_read_datatable_window(self):
+
+        sm = self.sm
+
+        sym = sm.create("rdtw", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        sym.cache()
+
+        adf = sym._read_datatable(['final'], start=dt.datetime(2010, 1, 5),
+                                  end=dt.datetime(2010, 1, 8))
+        assert list(adf.columns) == ['final']
+        assert adf.index.min() == dt.datetime(2010, 1, 5)
+        assert adf.index.max() == dt.datetime(2010, 1, 8)
+        assert adf.index.is_monotonic
+
+        assert list(sym.datatable_df.columns) == sym.dt_all_cols[1:]
+        assert len(sym.df) == len(sym.datatable_df)
+
+        adf = sym.get_df(last_n=5)
+        assert len(adf) == 5
+        assert (adf.values == sym.df.values[-5:]).all()
+
+        adf = sym.get_df(start=dt.datetime(2010, 1, 5), last_n=2)
+        assert (adf.index == sym.df.index[-2:]).all()
+
+        adf = sym.get_df(end=dt.datetime(2010, 1, 8))
+        assert adf.index.max() == dt.datetime(2010, 1, 8)
+
+    def test_lazy_datatable(self):
+
+        sm = self.sm
+
+        sym = sm.create("lazydt", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        sym.cache()
+        sm.ses.expunge_all()
+
+        sym = sm.get("lazydt")
+        assert sym._datatable is None
+
+        assert len(sym.df) == 54
+        assert sym.dt_all_cols == ['indx', 'final', 'override_feed000',
+                                   'feed001', 'failsafe_feed999']
+
+        sm.ses.expunge(sym)
+        other = sm.get("lazydt")
+        assert other is not sym
+        assert other.datatable is sym.datatable
+
+    def test_get_panel(self):
+
+        sm = self.sm
+
+        fxdata = os.path.join(curdir,'testdata','fxdata.csv')
+        for pair in ['EURUSD', 'GBPUSD', 'USDCAD']:
+            sym = sm.create("p" + pair, overwrite=True)
+            fdtemp = CSVFT(fxdata, pair, index_col=0)
+            sym.add_feed(fdtemp)
+            sym.set_indexing(FFillIT('B'))
+            sym.add_tags('panel')
+            sym.cache()
+
+        sm.get("pUSDCAD").add_alias("pCAD")
+        sm.complete()
+
+        adf = sm.get_panel(['pGBPUSD', 'pCAD', 'pEURUSD'])
+        assert list(adf.columns) == ['pGBPUSD', 'pEURUSD', 'pUSDCAD']
+
+        adf = sm.get_panel('panel', batchsize=2)
+        assert list(adf.columns) == ['pEURUSD', 'pGBPUSD', 'pUSDCAD']
+        for name in adf.columns:
+            sdf = sm.get(name).df
+            assert (adf[name].dropna() == sdf[name].dropna()).all()
+            assert (adf[name].dropna().index == sdf.index).all()
+
+        assert len(sm.get_panel('nothingtagged')) == 0
+
+        # a Symbol never cached has no datatable, so an empty column.
+        sym = sm.create("pUNCACHED", overwrite=True)
+        sym.add_feed(CSVFT(fxdata, 'EURUSD', index_col=0))
+        sm.complete()
+
+        adf = sm.get_panel(['pEURUSD', 'pUNCACHED'])
+        assert list(adf.columns) == ['pEURUSD', 'pUNCACHED']
+        assert adf['pUNCACHED'].isnull().all()
+        sdf = sm.get('pEURUSD').df
+        assert (adf['pEURUSD'].dropna() == sdf['pEURUSD'].dropna()).all()
+        assert isinstance(adf.index, pd.DatetimeIndex)
+
+        adf = sm.get_panel(['pUNCACHED'])
+        assert list(adf.columns) == ['pUNCACHED']
+        assert len(adf.dropna()) == 0
+
+    def test_staged_fetch_api_failure(self):
+
+        sm = self.sm
+
+        sym = sm.create("stgd", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        missing = os.path.join(curdir,'testdata','missing.csv')
+        fdtemp = CSVFT(missing, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+
+        sym.feeds[1].update_handle({'api_failure' : BitFlag(['report']),
+                                    'empty_feed' : BitFlag(['report'])})
+
+        rep = sym.cache()
+
+        assert len(sym.df) == 54
+        fdrp = rep.freports[1]
+        assert fdrp.handlepoints[0].hpoint == 'api_failure'
+
+    def test_fetchcache(self):
+
+        sm = self.sm
+
+        sym = sm.create("ftchc", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp)
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=[0], index_col=0)
+        sym.add_feed(fdtemp)
+
+        fc = FetchCache()
+        afeed = sym.feeds[1]
+        fdrp = FeedReport(afeed.fnum)
+        stype, kwargs = afeed.plan.source_kwargs(None, fdrp)
+        dr = pd.date_range(start='2010-01-01', periods=3, freq='D')
+        fc.put(stype, kwargs, pd.Series([7, 8, 9], dr))
+
+        rep = sym.cache(fetchcache=fc)
+
+        hits = [[rp.value for rp in fr.reportpoints
+                 if rp.attribute == 'fetchcache'] for fr in rep.freports]
+        assert hits == [[], ['series']]
+        assert list(sym.datatable_df['feed002'].dropna()) == [7, 8, 9]
+
+    def test_munging_pipeline(self):
+
+        sm = self.sm
+
+        sym = sm.create("mngpl", overwrite=True)
+        testdata = os.path.join(curdir,'testdata','testdailydata.csv')
+        fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+        sym.add_feed(fdtemp, munging=SimpleExampleMT(1, 5))
+
+        pipeline = load_plan(sm.ses, 'mngpl').feeds[0].munging
+        assert len(pipeline) == 2
+        assert load_plan(sm.ses, 'mngpl').feeds[0].munging is pipeline
+
+        raw = pd.Series([1.0, 2.0, 4.0, 4.0, 8.0, 16.0, 8.0])
+        expected = pd.rolling_mean(raw.pct_change(periods=1,
+                                                  fill_method='ffill'),
+                                   window=5, min_periods=5)
+        assert pipeline(raw).equals(expected)
+
+        # munging changed outside the ORM, eg. by another process, is
+        # still picked up.
+        sm.ses.execute("UPDATE _feed_munging_kwargs SET intcol = 2 "
+                       "WHERE symname = 'mngpl' AND kword = 'periods'")
+        sm.ses.commit()
+
+        changed = load_plan(sm.ses, 'mngpl').feeds[0].munging
+        assert changed is not pipeline
+        expected = pd.rolling_mean(raw.pct_change(periods=2,
+                                                  fill_method='ffill'),
+                                   window=5, min_periods=5)
+        assert changed(raw).equals(expected)
+
+        sym.cache()
+        amounts = pd.read_csv(testdata, index_col=0)['Amount']
+        expected = pd.rolling_mean(amounts.pct_change(periods=2,
+                                                      fill_method='ffill'),
+                                   window=5, min_periods=5)
+        assert list(sym.df.iloc[:, 0].dropna()) == list(expected.dropna())
+
     def test_validity_feed_match(self):
         
         sm = self.sm
@@ -501,12 +946,41 @@ class TestORM(object):
         
         report = sm.bulk_cache_of_tag('forex_report')
         print report.html
+
+        # one parse of fxdata.csv, shared by all three Symbols.
+        hits = [rp.value for rp in report.reportpoints
+                if rp.rpoint == 'fetchcache']
+        assert hits == [3]
         
         if inspect_reports:
             fout = file(os.path.join(curdir,'test_forex.html'),'w+')
             fout.write(report.html)
             fout.close()
 
+    @pytest.mark.parametrize('mode', ['thread', 'process'])
+    def test_concurrent_bulk_cache(self, tmpdir, mode):
+
+        # in-memory SQLite can't be shared by workers, so use a file.
+        eng = SetupTrump("sqlite:///" + str(tmpdir.join('bulk.db')))
+        sm = SymbolManager(eng)
+
+        fxdata = os.path.join(curdir,'testdata','fxdata.csv')
+        pairs = ['EURUSD', 'GBPUSD', 'USDCAD', 'USDJPY']
+        for pair in pairs:
+            sym = sm.create(pair, overwrite=True)
+            fdtemp = CSVFT(fxdata, pair, index_col=0)
+            sym.add_feed(fdtemp)
+            sym.set_indexing(FFillIT('B'))
+            sym.add_tags('forex_bulk')
+
+        report = sm.bulk_cache_of_tag('forex_bulk', workers=2, mode=mode,
+                                      source_limits={'PyDataCSV' : 1})
+
+        assert sorted(sr.name for sr in report.sreports) == pairs
+        for pair in pairs:
+            assert len(sm.get(pair).df) == 97
+        sm.finish()
+
     def test_search_meta(self):
 
         sm = self.sm
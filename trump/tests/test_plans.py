@@ -0,0 +1,116 @@
+from ..orm import SetupTrump, SymbolManager
+from ..plans import load_plans, load_plan, SymbolPlan, FeedPlan
+from ..templating.templates import CSVFT, SimpleExampleMT, FFillIT
+
+from sqlalchemy import event
+
+import pytest
+
+import datetime as dt
+import os
+import pickle
+
+curdir = os.path.dirname(os.path.realpath(__file__))
+testdata = os.path.join(curdir, 'testdata', 'testdailydata.csv')
+
+class TestPlans(object):
+
+    def setup_method(self, test_method):
+        self.eng = SetupTrump()
+        self.sm = SymbolManager(self.eng)
+
+    def create(self, name, n_feeds):
+        sym = self.sm.create(name, overwrite=True)
+        for _ in range(n_feeds):
+            fdtemp = CSVFT(testdata, 'Amount', parse_dates=0, index_col=0)
+            sym.add_feed(fdtemp, munging=SimpleExampleMT(1, 5))
+        sym.set_indexing(FFillIT('B'))
+        return sym
+
+    def count_queries(self, func):
+        queries = []
+        def count(conn, cursor, statement, *args):
+            queries.append(statement)
+        event.listen(self.eng, 'before_cursor_execute', count)
+        try:
+            return func(), len(queries)
+        finally:
+            event.remove(self.eng, 'before_cursor_execute', count)
+
+    def test_fixed_queries(self):
+        names = ['pln' + str(i) for i in range(4)]
+        for i, name in enumerate(names):
+            self.create(name, i + 1)
+        self.sm.ses.commit()
+
+        ses = self.sm.ses
+        plans, few = self.count_queries(lambda: load_plans(ses, names[:1]))
+        plans, many = self.count_queries(lambda: load_plans(ses, names))
+        assert few == many == 9
+
+        assert sorted(plans) == names
+        plan = plans['pln3']
+        assert isinstance(plan, SymbolPlan)
+        assert [fplan.fnum for fplan in plan.feeds] == [0, 1, 2, 3]
+        assert plan.indimp == 'DatetimeIndexImp'
+        assert plan.case == 'asfreq'
+        assert dict(plan.index_kwargs) == {'freq' : 'B', 'method' : 'ffill'}
+
+        fplan = plan.feeds[0]
+        assert isinstance(fplan, FeedPlan)
+        assert fplan.stype == 'PyDataCSV'
+        assert dict(fplan.kwargs)['data_column'] == 'Amount'
+        assert len(fplan.munging) == 2
+        handle = self.sm.get('pln3').feeds[0].handle
+        assert dict(fplan.handle)['api_failure'] == handle.api_failure.val
+
+    def test_cache_from_plan(self):
+        sym = self.create('plncache', 2)
+        self.sm.ses.commit()
+
+        plan = load_plan(self.sm.ses, 'plncache')
+
+        rep = sym.cache(plan=plan)
+        assert len(rep.freports) == 2
+        assert len(sym.df.dropna()) > 0
+
+        with pytest.raises(AttributeError):
+            plan.feeds[0].stype = 'DBAPI'
+
+    def test_pickled_plan_runs_without_session(self):
+        sym = self.create('plnpkl', 2)
+        self.sm.add_override(sym, dt.date(2010, 1, 5), 100)
+        self.sm.ses.commit()
+
+        plan = pickle.loads(pickle.dumps(load_plan(self.sm.ses, 'plnpkl')))
+        assert len(plan.feeds[0].munging) == 2
+        assert len(plan.overrides) == 1
+
+        self.sm.ses.close()
+        data, rep = plan.run()
+        assert rep.name == 'plnpkl'
+        assert data.ix['2010-01-05', 'final'] == 100
+
+        sym = self.sm.get('plnpkl')
+        sym.cache()
+        assert sym.df['plnpkl'].equals(data['final'])
+
+    def test_override_added_after_plan_loaded(self):
+        sym = self.create('plnlate', 1)
+        self.sm.add_override(sym, dt.date(2010, 1, 5), 100)
+        self.sm.ses.commit()
+
+        plans = load_plans(self.sm.ses, ['plnlate'])
+        self.sm.add_override(sym, dt.date(2010, 1, 6), 999)
+        self.sm.add_override(sym, dt.date(2010, 1, 5), 500)
+
+        sym.cache(plan=plans['plnlate'])
+        assert sym.df.ix['2010-01-05', 'plnlate'] == 100
+
+        # the plan didn't hold the later Overrides, so they're still dirty.
+        assert sym.refresh_dirty() == 2
+        assert sym.df.ix['2010-01-05', 'plnlate'] == 500
+        assert sym.df.ix['2010-01-06', 'plnlate'] == 999
+
+        sym.cache(plan=load_plan(self.sm.ses, 'plnlate'))
+        assert sym.refresh_dirty() == 0
@@ -0,0 +1,72 @@
+from .. import sourcing
+from ..snapshots import SnapshotStore
+from ..sourcing import FetchCache
+
+import os
+import time
+
+import pandas as pd
+
+
+class TestSnapshots(object):
+
+    def test_put_get(self, tmpdir):
+        store = SnapshotStore(str(tmpdir), {'Quandl' : 60})
+        data = pd.Series([1.0, 2.0], pd.date_range('2015-01-01', periods=2))
+
+        store.put('Quandl', {'dataset' : 'A'}, data)
+        assert store.get('Quandl', {'dataset' : 'A'}).equals(data)
+        assert store.get('Quandl', {'dataset' : 'B'}) is None
+
+        # no time-to-live, so nothing stored
+        store.put('DBAPI', {'dataset' : 'A'}, data)
+        assert store.get('DBAPI', {'dataset' : 'A'}) is None
+        assert len(os.listdir(str(tmpdir))) == 1
+
+    def test_ttl(self, tmpdir):
+        store = SnapshotStore(str(tmpdir), {'default' : 60})
+        store.put('Quandl', {}, pd.Series([1.0]))
+
+        path = store.path('Quandl', {})
+        old = time.time() - 120
+        os.utime(path, (old, old))
+
+        assert store.get('Quandl', {}) is None
+
+    def test_eviction(self, tmpdir):
+        store = SnapshotStore(str(tmpdir), {'default' : 60})
+        data = pd.Series(range(10000), dtype=float)
+
+        for i in range(3):
+            store.put('Quandl', {'i' : i}, data)
+            old = time.time() - 10 * (3 - i)
+            os.utime(store.path('Quandl', {'i' : i}), (old, old))
+        size = os.path.getsize(store.path('Quandl', {'i' : 0}))
+
+        store.max_size = size * 2.5
+        store.put('Quandl', {'i' : 3}, data)
+
+        kept = [store.get('Quandl', {'i' : i}) is not None for i in range(4)]
+        assert kept == [False, False, True, True]
+
+    def test_fetchcache(self, tmpdir, monkeypatch):
+        fetched = []
+        def counting_fetch(stype, kwargs, driver=None):
+            fetched.append(kwargs['v'])
+            return pd.Series([kwargs['v']])
+        monkeypatch.setattr(sourcing, 'fetch', counting_fetch)
+
+        store = SnapshotStore(str(tmpdir), {'Counted' : 60})
+
+        data, how = FetchCache(store).fetch('Counted', {'v' : 1.0})
+        assert how is None
+
+        data, how = FetchCache(store).fetch('Counted', {'v' : 1.0})
+        assert how == 'snapshot'
+        assert list(data) == [1.0]
+
+        fc = FetchCache(store, force_refresh=True)
+        data, how = fc.fetch('Counted', {'v' : 1.0})
+        assert how is None
+
+        assert fetched == [1.0, 1.0]
@@ -0,0 +1,253 @@
+from .. import sourcing
+from ..sourcing import FetchStage, FetchTimeout, DBAPIConnectionPool, \
+    FetchCache, fetch, dbapi_pool, read_csv_columns
+
+import os
+import pickle
+import sqlite3
+import threading
+from StringIO import StringIO
+import time
+
+import pandas as pd
+import pytest
+
+def slow_fetch(stype, kwargs, driver=None):
+    time.sleep(kwargs['secs'])
+    return pd.Series([kwargs['secs']])
+
+curdir = os.path.dirname(os.path.realpath(__file__))
+fxdata = os.path.join(curdir, 'testdata', 'fxdata.csv')
+
+def make_keycol_db(dbfile):
+    con = sqlite3.connect(dbfile)
+    con.execute("CREATE TABLE src (dt TEXT, k TEXT, v REAL)")
+    rows = [('2015-01-0' + str(i), k, i * m)
+            for i in range(1, 6) for k, m in [('a', 1), ('b', 10)]]
+    con.executemany("INSERT INTO src VALUES (?, ?, ?)", rows)
+    con.commit()
+    con.close()
+
+class TestSourcing(object):
+
+    def setup_method(self, test_method):
+        self.stage = FetchStage(workers=3, timeouts={'default' : 5,
+                                                     'Slow' : 0.2})
+
+    def teardown_method(self, test_method):
+        self.stage.close()
+
+    def test_concurrent_fetches(self, monkeypatch):
+        monkeypatch.setattr(sourcing, 'fetch', slow_fetch)
+
+        start = time.time()
+        pending = [self.stage.submit('Fast', {'secs' : 0.5})
+                   for _ in range(3)]
+        results = [p.result()[0] for p in pending]
+
+        assert results == [0.5] * 3
+        assert time.time() - start < 1.4
+
+    def test_timeout(self, monkeypatch):
+        monkeypatch.setattr(sourcing, 'fetch', slow_fetch)
+
+        assert self.stage.timeout('slow') == 0.2
+        assert self.stage.timeout('Other') == 5
+
+        with pytest.raises(FetchTimeout):
+            self.stage.submit('Slow', {'secs' : 1}).result()
+
+    def test_timeout_starts_in_slot(self, monkeypatch):
+        monkeypatch.setattr(sourcing, 'fetch', slow_fetch)
+
+        # queued behind a source limit, the fetches take 0.9s in all,
+        # but each one only 0.3s of its 0.5s timeout.
+        sourcing.set_source_limits({'Limited' : threading.Semaphore(1)})
+        try:
+            stage = FetchStage(workers=3, timeouts={'default' : 0.5},
+                               queue_timeout=5)
+            pending = [stage.submit('Limited', {'secs' : 0.3})
+                       for _ in range(3)]
+            assert [p.result()[0] for p in pending] == [0.3] * 3
+            stage.close()
+        finally:
+            sourcing.set_source_limits({})
+
+    def test_queued_fetch_timeout(self, monkeypatch):
+        calls = []
+        def stuck_fetch(stype, kwargs, driver=None):
+            calls.append(kwargs)
+            time.sleep(2)
+            return pd.Series([2])
+        monkeypatch.setattr(sourcing, 'fetch', stuck_fetch)
+
+        # fetches queued behind one that's stuck, give up waiting for
+        # the source slot, rather than waiting for it to be freed.
+        sourcing.set_source_limits({'Stuck' : threading.Semaphore(1)})
+        try:
+            stage = FetchStage(workers=3, timeouts={'default' : 0.2},
+                               queue_timeout=0.4)
+            start = time.time()
+            pending = [stage.submit('Stuck', {}) for _ in range(3)]
+            for p in pending:
+                with pytest.raises(FetchTimeout):
+                    p.result()
+            assert time.time() - start < 1
+            stage.close()
+
+            # and the abandoned fetches never run, once the slot is free.
+            stage.pool.join()
+            assert len(calls) == 1
+        finally:
+            sourcing.set_source_limits({})
+
+    def test_fetch_exception(self):
+        with pytest.raises(Exception) as exc:
+            self.stage.submit('NotASource', {}).result()
+        assert "Unknown Source Type" in str(exc.value)
+
+    def test_dbapi_pool(self, tmpdir, monkeypatch):
+        dbfile = str(tmpdir.join('src.db'))
+        make_keycol_db(dbfile)
+
+        pool = DBAPIConnectionPool(size=1, idle_timeout=60)
+        monkeypatch.setattr(sourcing, 'dbapi_pool', lambda: pool)
+
+        kwargs = {'database' : dbfile, 'dbinstype' : 'KEYCOL',
+                  'indexcol' : 'dt', 'datacol' : 'v', 'table' : 'src',
+                  'keycol' : 'k', 'key' : 'a'}
+
+        data = fetch('DBAPI', dict(kwargs), 'sqlite3')
+        assert list(data.values) == [1, 2, 3, 4, 5]
+
+        key = ('sqlite3', (('database', dbfile),))
+        pooled = pool.idle[key][0][0]
+
+        data = fetch('DBAPI', dict(kwargs, since='2015-01-04'), 'sqlite3')
+        assert list(data.values) == [4, 5]
+        assert pool.idle[key][0][0] is pooled
+
+        pool.idle_timeout = 0
+        pool._evict()
+        assert pool.idle == {}
+
+        with pytest.raises(Exception):
+            fetch('DBAPI', dict(kwargs, table='nope'), 'sqlite3')
+        assert pool.idle == {}
+
+    def test_dbapi_pool_per_process(self):
+        assert dbapi_pool() is dbapi_pool()
+
+    def test_prefetch_keycol(self, tmpdir, monkeypatch):
+        dbfile = str(tmpdir.join('src.db'))
+        make_keycol_db(dbfile)
+
+        queries = []
+        class Counted(DBAPIConnectionPool):
+            def connection(self, driver, con_kwargs):
+                queries.append(driver)
+                return super(Counted, self).connection(driver, con_kwargs)
+        pool = Counted(size=1)
+        monkeypatch.setattr(sourcing, 'dbapi_pool', lambda: pool)
+
+        base = {'database' : dbfile, 'dbinstype' : 'KEYCOL',
+                'indexcol' : 'dt', 'datacol' : 'v', 'table' : 'src',
+                'keycol' : 'k'}
+        reqs = [('DBAPI', dict(base, key=k)) for k in ['a', 'b', 'c']]
+        reqs.append(('PyDataCSV', {'filepath_or_buffer' : 'x.csv'}))
+
+        fc = FetchCache()
+        assert fc.prefetch_keycol(reqs, 'sqlite3', batchsize=2) == 2
+        assert len(queries) == 2
+        assert len(fc) == 2
+
+        for key, mult in [('a', 1), ('b', 10)]:
+            single = fetch('DBAPI', dict(base, key=key), 'sqlite3')
+            cached = fc.get('DBAPI', dict(base, key=key))
+            assert (cached == single).all()
+            assert list(cached.values) == [i * mult for i in range(1, 6)]
+
+        assert fc.get('DBAPI', dict(base, key='c')) is None
+
+        # an incremental cache's requests only get their recent data.
+        since = dict(base, since='2015-01-03')
+        assert fc.get('DBAPI', dict(since, key='a')) is None
+        reqs = [('DBAPI', dict(since, key=k)) for k in ['a', 'b']]
+        assert fc.prefetch_keycol(reqs, 'sqlite3') == 2
+        for key, mult in [('a', 1), ('b', 10)]:
+            single = fetch('DBAPI', dict(since, key=key), 'sqlite3')
+            cached = fc.get('DBAPI', dict(since, key=key))
+            assert (cached == single).all()
+            assert list(cached.values) == [i * mult for i in range(3, 6)]
+
+    def test_read_csv_columns(self, monkeypatch):
+        full = pd.read_csv(fxdata, index_col=0, parse_dates=[0])
+
+        reads = []
+        read_csv = pd.read_csv
+        def logged(fpob, **kwargs):
+            reads.append(kwargs)
+            return read_csv(fpob, **kwargs)
+        monkeypatch.setattr(pd, 'read_csv', logged)
+
+        df = read_csv_columns(fxdata, ['GBPUSD', 'EURUSD'],
+                              {'index_col' : 0, 'parse_dates' : [0],
+                               'chunksize' : 7})
+        assert reads[-1]['usecols'] == ['Date', 'EURUSD', 'GBPUSD']
+        assert reads[-1]['index_col'] == 'Date'
+        assert isinstance(df.index, pd.DatetimeIndex)
+        assert (df == full[['GBPUSD', 'EURUSD']]).all().all()
+
+        buf = StringIO(open(fxdata).read())
+        df = read_csv_columns(buf, ['USDJPY'], {'index_col' : 0})
+        assert 'usecols' not in reads[-1]
+        assert (df['USDJPY'].values == full['USDJPY'].values).all()
+
+    def test_prefetch_csv(self, monkeypatch):
+        parses = []
+        def counted(fpob, columns, kwargs):
+            parses.append(columns)
+            return read_csv_columns(fpob, columns, kwargs)
+        monkeypatch.setattr(sourcing, 'read_csv_columns', counted)
+
+        base = {'filepath_or_buffer' : fxdata, 'index_col' : 0}
+        reqs = [('PyDataCSV', dict(base, data_column=c))
+                for c in ['GBPUSD', 'EURUSD', 'USDCAD']]
+        reqs.append(('PyDataCSV', dict(base, data_column='USDJPY',
+                                       parse_dates=[0])))
+
+        fc = FetchCache()
+        assert fc.prefetch_csv(reqs) == 3
+        assert parses == [['EURUSD', 'GBPUSD', 'USDCAD']]
+
+        single = fetch('PyDataCSV', dict(reqs[0][1]))
+        assert (fc.get(*reqs[0]) == single).all()
+        assert fc.get(*reqs[3]) is None
+
+    def test_shared_payload(self, monkeypatch):
+        payloads = []
+        def slow_payload(stype, kwargs):
+            payloads.append(kwargs)
+            time.sleep(0.2)
+            return pd.DataFrame({'Open' : [1.0], 'Close' : [2.0]})
+        monkeypatch.setattr(sourcing, 'fetch_payload', slow_payload)
+
+        fc = FetchCache()
+        pending = [self.stage.submit('Quandl', {'dataset' : 'X/Y',
+                                                'fieldname' : fn}, None, fc)
+                   for fn in ['Open', 'Close', 'Open']]
+        results = [p.result()[0] for p in pending]
+
+        assert results == [1.0, 2.0, 1.0]
+        assert payloads == [{'dataset' : 'X/Y'}]
+        assert sorted(p.cached for p in pending) == [None, 'payload', 'payload']
+        assert fc.hits == 2
+
+        data, cached = fc.fetch('Quandl', {'dataset' : 'X/Z',
+                                           'fieldname' : 'Open'})
+        assert cached is None
+        assert len(payloads) == 2
+
+        fc = pickle.loads(pickle.dumps(fc))
+        assert fc.fetch('Quandl', {'dataset' : 'X/Z',
+                                   'fieldname' : 'Close'})[1] == 'payload'
@@ -0,0 +1,50 @@
+from ..writing import writer_for, ExecuteManyWriter, SQLiteWriter
+
+from sqlalchemy import create_engine, Table, Column, MetaData, DateTime, Float
+from sqlalchemy.orm import sessionmaker
+
+import pandas as pd
+
+class TestWriting(object):
+
+    def setup_method(self, test_method):
+        self.eng = create_engine("sqlite://")
+        meta = MetaData()
+        self.tbl = Table('wrt', meta,
+                         Column('indx', DateTime, primary_key=True),
+                         Column('final', Float),
+                         Column('feed001', Float))
+        meta.create_all(self.eng)
+        self.ses = sessionmaker(bind=self.eng)()
+
+    def test_writer_for(self):
+        assert isinstance(writer_for(self.eng), SQLiteWriter)
+        assert writer_for(self.eng, chunksize=7).chunksize == 7
+
+    def test_chunked_write(self):
+
+        dr = pd.date_range(start='2015-01-01', periods=25, freq='D')
+        df = pd.DataFrame({'final' : range(25), 'feed001' : range(25)},
+                          index=dr, dtype=float)
+        df.iloc[3, 1] = pd.np.nan
+
+        writer = writer_for(self.eng, chunksize=10)
+        assert [len(c) for c in writer.chunks(df)] == [10, 10, 5]
+
+        cache_size = self.ses.execute("PRAGMA cache_size").scalar()
+        assert writer.write(self.ses, self.tbl, df) == 25
+        self.ses.commit()
+        assert self.ses.execute("PRAGMA cache_size").scalar() == cache_size
+
+        rows = self.ses.query(self.tbl).order_by(self.tbl.c.indx).all()
+        assert len(rows) == 25
+        assert rows[24].final == 24.0
+        assert rows[3].final is None
+
+    def test_executemany_writer(self):
+
+        df = pd.DataFrame({'final' : [1.5], 'feed001' : [1.5]},
+                          index=[pd.Timestamp('2015-01-01')])
+        ExecuteManyWriter(5).write(self.ses, self.tbl, df)
+        self.ses.commit()
+        assert self.ses.query(self.tbl.c.final).scalar() == 1.5
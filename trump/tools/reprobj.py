@@ -1,55 +1,211 @@
 """
-Creates the ReprObjType object, which enables any python object to be stored
+Creates the ReprObjType object, which enables python objects to be stored
 as a string in a database.
 
-In order for Trump to support it, reprobj.py needs to be able to run
-an exec command, of the object's repr, successfully.  So, extra
-import statements may be needed and added in such a way that the import
-statement matches the object's repr.
+Values are stored in a tagged text form, a one character type tag, a
+colon, then the value, eg. 'T:2014-01-01 00:00:00.000000' for a datetime.
+Supported types are None, bools, integers, floats, strings, dates,
+datetimes, and lists or tuples of those.  Decoding dispatches on the tag,
+so nothing is compiled or executed.
+
+Older databases stored each value's repr, which used to be exec'd.  Those
+are still read, via a restricted literal parser, and can be converted to
+the tagged form with migrate_reprobj_columns().
 """
 
+import ast
+import datetime
+import json
+import numbers
+
+from sqlalchemy import select, and_, literal, type_coerce
 from sqlalchemy.types import TypeDecorator, String
 
-# Wrap any needed third-party libraries or modules, in a try-pass statetment.
-# to ensure any other users, stay sane.  Example was done with the 
-# datetime, which obviously all users have.
+def _enc_seq(value):
+    return json.dumps([encode(v) for v in value])
+
+def encode(value):
+    """
+    Encodes a python object in the tagged text form.
+
+    Raises
+    ------
+    TypeError
+        If the object, or anything in it, isn't a supported type.
+    """
+    if value is None:
+        return "n:"
+    elif isinstance(value, bool):
+        return "b:" + str(int(value))
+    elif isinstance(value, str):
+        return "s:" + value
+    elif isinstance(value, unicode):
+        return "u:" + value
+    elif isinstance(value, numbers.Integral):
+        return "i:" + str(int(value))
+    elif isinstance(value, numbers.Real):
+        return "f:" + repr(float(value))
+    elif isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            raise TypeError("Timezone aware datetimes can't be stored")
+        # datetime.strftime doesn't support years before 1900, in Python 2.
+        return "T:{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}.{:06d}".format(
+            value.year, value.month, value.day, value.hour, value.minute,
+            value.second, value.microsecond)
+    elif isinstance(value, datetime.date):
+        return "D:{:04d}-{:02d}-{:02d}".format(value.year, value.month,
+                                               value.day)
+    elif isinstance(value, list):
+        return "L:" + _enc_seq(value)
+    elif isinstance(value, tuple):
+        return "U:" + _enc_seq(value)
+    raise TypeError("{} can't be stored by ReprObjType".format(repr(value)))
+
+def _dec_datetime(txt):
+    return datetime.datetime(int(txt[0:4]), int(txt[5:7]), int(txt[8:10]),
+                             int(txt[11:13]), int(txt[14:16]),
+                             int(txt[17:19]), int(txt[20:26]))
+
+def _dec_str(txt):
+    # databases hand back unicode, even for values stored from a str.
+    if isinstance(txt, unicode):
+        return txt.encode('utf-8')
+    return txt
+
+def _dec_date(txt):
+    return datetime.date(int(txt[0:4]), int(txt[5:7]), int(txt[8:10]))
+
+_decoders = {'n' : lambda txt: None,
+             'b' : lambda txt: txt == '1',
+             's' : _dec_str,
+             'u' : unicode,
+             'i' : int,
+             'f' : float,
+             'T' : _dec_datetime,
+             'D' : _dec_date,
+             'L' : lambda txt: [decode(v) for v in json.loads(txt)],
+             'U' : lambda txt: tuple(decode(v) for v in json.loads(txt))}
+
+def is_tagged(value):
+    return len(value) > 1 and value[1] == ':' and value[0] in _decoders
+
+def decode(value):
+    """
+    Decodes the tagged text form, or a legacy repr string, back to the
+    python object.
+    """
+    if is_tagged(value):
+        return _decoders[value[0]](value[2:])
+    return decode_legacy(value)
 
-try: import datetime
-except: pass
+_legacy_names = {'None' : None, 'True' : True, 'False' : False}
+_legacy_calls = {'date' : datetime.date, 'datetime' : datetime.datetime}
+
+def _legacy_eval(node):
+    """ evaluates literals, and datetime.date/datetime calls, only """
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Attribute) and func.attr in _legacy_calls \
+           and isinstance(func.value, ast.Name) \
+           and func.value.id == 'datetime' and not node.keywords:
+            args = [_legacy_eval(arg) for arg in node.args]
+            return _legacy_calls[func.attr](*args)
+        raise ValueError("Unsupported call in ReprObjType value")
+    elif isinstance(node, ast.Name) and node.id in _legacy_names:
+        return _legacy_names[node.id]
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        vals = [_legacy_eval(elt) for elt in node.elts]
+        return tuple(vals) if isinstance(node, ast.Tuple) else vals
+    return ast.literal_eval(node)
+
+def decode_legacy(value):
+    """
+    Decodes the repr string of an object, as stored by older versions of
+    Trump, without exec.
+
+    Raises
+    ------
+    ValueError
+        If the repr is anything other than a literal, or a
+        datetime.date or datetime.datetime.
+    """
+    return _legacy_eval(ast.parse(value.strip(), mode='eval').body)
 
 
 class ReprObjType(TypeDecorator):
 
-    """ 
+    """
     SQLAlchemy type definition for the ReprObj implementation.
-    A ReprObj is a python object that enables lazily storing
-    flags into a single integer value for quick database access and use."""
+    A ReprObj is a python object, stored as tagged text, see encode()."""
 
     impl = String
-    
+
     def __init__(self, *args, **kwargs):
         super(ReprObjType, self).__init__(*args, **kwargs)
 
     def process_bind_param(self, value, dialect):
         """
         When SQLAlchemy binds a ReprObjType, it converts it
-        to a string for storage in the database, via the python
-        repr string equivalent.
+        to a string for storage in the database, via encode().
         """
         if value is not None:
-            value = repr(value)
+            value = encode(value)
         return value
 
     def process_result_value(self, value, dialect):
         """
         When SQLAlchemy gets the string representation from a ReprObjType
-        column, it converts it to the python equivalent via exec.
+        column, it converts it to the python equivalent via decode().
         """
         if value is not None:
-            cmd = "value = {}".format(value)
-            exec(cmd)
+            value = decode(value)
         return value
 
     def copy(self):
         return ReprObjType()
 
+
+def migrate_reprobj_columns(bind, metadata):
+    """
+    Rewrites legacy repr strings, in every ReprObjType column of the
+    metadata's tables, in the tagged form.
+
+    Parameters
+    ----------
+    bind : Engine or Connection
+    metadata : sqlalchemy.MetaData
+
+    Returns
+    -------
+    int, the number of values rewritten.
+    """
+    def raw(col):
+        # selected and compared as the stored strings, not decoded values.
+        if isinstance(col.type, ReprObjType):
+            return type_coerce(col, String)
+        return col
+
+    migrated = 0
+    for table in metadata.sorted_tables:
+        cols = [c for c in table.columns if isinstance(c.type, ReprObjType)]
+        if not cols:
+            continue
+        pkeys = list(table.primary_key.columns)
+
+        qry = select([raw(pk).label('pk_' + pk.name) for pk in pkeys] +
+                     [raw(c).label(c.name) for c in cols])
+
+        for row in bind.execute(qry).fetchall():
+            newvals = {}
+            for col in cols:
+                value = row[col.name]
+                if value is not None and not is_tagged(value):
+                    newvals[col.name] = encode(decode_legacy(value))
+            if newvals:
+                crit = and_(*(raw(pk) == row['pk_' + pk.name] for pk in pkeys))
+                upd = table.update().where(crit)
+                upd = upd.values({k : literal(v, String)
+                                  for k, v in newvals.iteritems()})
+                bind.execute(upd)
+                migrated += len(newvals)
+    return migrated
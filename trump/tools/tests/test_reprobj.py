@@ -14,7 +14,9 @@ session = DBSession()
 
 metadata = MetaData(bind=engine)
 
-from ..reprobj import ReprObjType
+from ..reprobj import ReprObjType, encode, decode, migrate_reprobj_columns
+
+import pytest
 
 class ReprObjExample(Base):
     __tablename__ = 'reprobjex'
@@ -44,3 +46,54 @@ class TestReprObj(object):
             
             session.delete(roe)
             session.commit()
+
+    def test_codec(self):
+        tobjs = [None, True, False, 0, -12, 2 ** 70, 2.5, float('inf'),
+                 'three', u'f\xfcnf', '', 'a:b', dt.date(1850, 12, 31),
+                 dt.datetime(2014, 1, 2, 3, 4, 5, 6), [1, 'two', None],
+                 (dt.date(2014, 1, 1), [3.0, (4,)]), [], ()]
+        for tobj in tobjs:
+            res = decode(encode(tobj))
+            assert res == tobj
+            assert type(res) == type(tobj)
+
+        assert encode(dt.datetime(2014, 1, 1)) == "T:2014-01-01 00:00:00.000000"
+
+        with pytest.raises(TypeError):
+            encode({'a' : 1})
+
+    def test_legacy(self):
+        legacy = {"1" : 1, "-2.5" : -2.5, "'three'" : 'three',
+                  "u'four'" : u'four', "None" : None, "True" : True,
+                  "datetime.date(2014, 1, 1)" : dt.date(2014, 1, 1),
+                  "datetime.datetime(2014, 1, 1, 5, 6)" :
+                      dt.datetime(2014, 1, 1, 5, 6),
+                  "[1, (2, datetime.date(2014, 1, 1))]" :
+                      [1, (2, dt.date(2014, 1, 1))]}
+        for rpr, tobj in legacy.iteritems():
+            assert decode(rpr) == tobj
+
+        for bad in ["__import__('os').getcwd()", "datetime.os", "open('f')"]:
+            with pytest.raises(ValueError):
+                decode(bad)
+
+    def test_migration(self):
+        tbl = ReprObjExample.__table__
+        for i, rpr in enumerate(["datetime.date(2014, 1, 1)", "u'x'"]):
+            session.execute("INSERT INTO reprobjex VALUES ({}, :v)".format(i),
+                            {'v' : rpr})
+        session.add(ReprObjExample(idcol=2, excol=[1, 2]))
+        session.commit()
+
+        assert migrate_reprobj_columns(session.connection(),
+                                       Base.metadata) == 2
+        session.commit()
+
+        raw = session.execute("SELECT excol FROM reprobjex ORDER BY idcol")
+        assert [r[0] for r in raw] == ['D:2014-01-01', 'u:x', 'L:["i:1", "i:2"]']
+
+        vals = session.query(ReprObjExample.excol).order_by(tbl.c.idcol)
+        assert [r[0] for r in vals] == [dt.date(2014, 1, 1), u'x', [1, 2]]
+
+        session.query(ReprObjExample).delete()
+        session.commit()
@@ -0,0 +1,139 @@
+###############################################################################
+#
+# PyLint tests that will never be applied by Trump.
+#
+# Used * or ** magic, we're not getting rid of this, it's imperative to Trump.
+# pylint: disable-msg=W0142
+
+"""
+Bulk writers load a DataFrame into a Symbol's datatable, one chunk at
+a time, so peak memory is bounded by the chunk size rather than the
+length of the Symbol's history.  The fastest path available for the
+database's dialect is used.
+"""
+
+from StringIO import StringIO
+
+from trump.options import read_config
+
+
+class ExecuteManyWriter(object):
+
+    """
+    Inserts chunks of rows with a single executemany per chunk.
+    Works with any dialect.
+    """
+
+    def __init__(self, chunksize=None):
+        """
+        Parameters
+        ----------
+        chunksize : int, optional
+            Rows per chunk.  Defaults to the [writing] chunksize setting
+            in trump.cfg, or 10000.
+        """
+        if chunksize is None:
+            chunksize = read_config(sect='writing', sett='chunksize',
+                                    default='10000')
+        self.chunksize = int(chunksize)
+
+    def chunks(self, df):
+        for i in range(0, len(df), self.chunksize):
+            yield df.iloc[i:i + self.chunksize]
+
+    def write(self, ses, table, df):
+        """
+        Inserts the rows of df into table, without committing.
+
+        Parameters
+        ----------
+        ses : Session
+        table : sqlalchemy.Table
+        df : pandas.DataFrame
+            Indexed by the datatable's indx, with one column for each of
+            the table's other columns.
+
+        Returns
+        -------
+        int, the number of rows written.
+        """
+        df = df.copy(deep=False)
+        df.index.name = 'indx'
+        for chunk in self.chunks(df):
+            self.write_chunk(ses, table, chunk)
+        return len(df)
+
+    def write_chunk(self, ses, table, chunk):
+        records = chunk.reset_index().to_dict(orient='records')
+        ses.execute(table.insert(), records)
+
+
+class SQLiteWriter(ExecuteManyWriter):
+
+    """
+    Chunked executemany, with SQLite's page cache enlarged for the
+    duration of the write.
+
+    Pragmas which can't be changed inside a transaction, such as
+    synchronous and journal_mode, are left alone, since the datatable
+    is always written within the caller's transaction.
+    """
+
+    cache_size = -64000  # negative values are KiB, so ~64MB
+
+    def write(self, ses, table, df):
+        cur = ses.execute("PRAGMA cache_size").scalar()
+        ses.execute("PRAGMA cache_size = {}".format(self.cache_size))
+        try:
+            return super(SQLiteWriter, self).write(ses, table, df)
+        finally:
+            ses.execute("PRAGMA cache_size = {}".format(cur))
+
+
+class PostgresCopyWriter(ExecuteManyWriter):
+
+    """
+    Streams each chunk through PostgreSQL's COPY FROM STDIN, via an
+    in-memory CSV buffer.  Requires psycopg2.
+    """
+
+    def write_chunk(self, ses, table, chunk):
+        prep = ses.bind.dialect.identifier_preparer
+
+        cols = [chunk.index.name] + list(chunk.columns)
+        cols = ", ".join(prep.quote(c) for c in cols)
+
+        buf = StringIO()
+        chunk.to_csv(buf, header=False, na_rep='', float_format='%r')
+        buf.seek(0)
+
+        qry = "COPY {} ({}) FROM STDIN WITH CSV"
+        qry = qry.format(prep.format_table(table), cols)
+
+        cur = ses.connection().connection.cursor()
+        try:
+            cur.copy_expert(qry, buf)
+        finally:
+            cur.close()
+
+
+bulkwriters = {'sqlite': SQLiteWriter,
+               'postgresql+psycopg2': PostgresCopyWriter}
+
+def writer_for(bind, chunksize=None):
+    """
+    Picks the bulk writer for an engine or connection's dialect.
+
+    Parameters
+    ----------
+    bind : Engine or Connection
+    chunksize : int, optional
+
+    Returns
+    -------
+    ExecuteManyWriter, or one of its subclasses.
+    """
+    dialect = bind.dialect
+    writer = bulkwriters.get("{}+{}".format(dialect.name, dialect.driver))
+    writer = writer or bulkwriters.get(dialect.name, ExecuteManyWriter)
+    return writer(chunksize)